@@ -0,0 +1,152 @@
+from urllib.parse import urlparse
+import asyncio
+import inspect
+import random
+import time
+import requests
+from requests.structures import CaseInsensitiveDict
+from PageFetcher import PageFetcher, FetchResult, TransportResponse, RETRY_STATUS_CODES, USER_AGENT, get_not_modified_headers
+
+# aiohttp is only needed to reach the network, offline transports work without it
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class AiohttpTransport:
+    # One session per event loop, opened by the fetcher before a batch and closed after it
+    def __init__(self, pool_size=100):
+        if aiohttp is None:
+            raise ImportError("aiohttp is required by the async backend, install it with 'pip install aiohttp'")
+        self._pool_size = pool_size
+        self._session = None
+
+    async def open(self):
+        self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self._pool_size))
+
+    async def get(self, url, headers, timeout):
+        try:
+            async with self._session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                return TransportResponse(response.status, CaseInsensitiveDict(response.headers), await response.read())
+        except asyncio.TimeoutError as e:
+            raise requests.Timeout(str(e)) from e
+        except aiohttp.ClientError as e:
+            raise requests.ConnectionError(str(e)) from e
+
+    async def close(self):
+        await self._session.close()
+        self._session = None
+
+
+class TokenBucket:
+    # Up to 'capacity' requests at once, then 'rate' requests per second. Tokens are taken without
+    # awaiting, a request finding the bucket empty reserves the next one and sleeps until then, so
+    # a bucket holds no loop-bound state and keeps its level from one batch to the next.
+    def __init__(self, rate, capacity=1):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+
+    async def acquire(self):
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate) - 1
+        self._updated_at = now
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self._rate)
+
+
+class AsyncPageFetcher(PageFetcher):
+    # Same cache, retries and interface as PageFetcher, but all pages of a batch are fetched by a
+    # single event loop. Requests to a host share one token bucket, at most max_concurrency are in
+    # flight, and a url requested several times in a batch is only fetched once.
+    def __init__(self, transport=None, cache_dir=None, ttl=300, timeout=10, max_retries=3, backoff=0.5,
+                 max_concurrency=50, rate_limit=None, burst=1):
+        super().__init__(transport if transport is not None else AiohttpTransport(pool_size=max_concurrency),
+                         cache_dir, ttl, timeout, max_retries, backoff, max_workers=max_concurrency)
+        self._max_concurrency = max_concurrency
+        self._rate_limit = rate_limit
+        self._burst = burst
+        # Per-host buckets live as long as the fetcher, so back-to-back batches share the rate
+        self._buckets = {}
+
+    # Transports may be asynchronous or not, offline transports are simply called
+    async def _transport_get(self, url, headers):
+        response = self._transport.get(url, headers, self._timeout)
+        return await response if inspect.isawaitable(response) else response
+
+    async def _get_with_retries_async(self, url, headers):
+        host = urlparse(url).netloc
+        for attempt in range(self._max_retries + 1):
+            try:
+                async with self._semaphore:
+                    if self._rate_limit:
+                        if host not in self._buckets:
+                            self._buckets[host] = TokenBucket(self._rate_limit, self._burst)
+                        await self._buckets[host].acquire()
+                    response = await self._transport_get(url, headers)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == self._max_retries:
+                    return response
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self._max_retries:
+                    raise
+            await asyncio.sleep(self._backoff * 2 ** attempt * (1 + random.random()))
+
+    async def _fetch_async(self, url):
+        cached = self._read_cache(url)
+        if cached is not None and time.time() - cached['FetchedAt'] < self._ttl:
+            return FetchResult(url, cached['Content'], False, cached['ETag'])
+
+        headers = {'User-Agent': USER_AGENT}
+        if cached is not None:
+            if cached['ETag']:
+                headers['If-None-Match'] = cached['ETag']
+            if cached['LastModified']:
+                headers['If-Modified-Since'] = cached['LastModified']
+
+        response = await self._get_with_retries_async(url, headers)
+        if response.status_code == 304 and cached is not None:
+            self._write_cache(url, None, get_not_modified_headers(cached, response.headers))
+            return FetchResult(url, cached['Content'], False, cached['ETag'])
+        if response.status_code >= 400:
+            raise requests.HTTPError(f"{response.status_code} error while fetching {url}")
+
+        self._write_cache(url, response.content, response.headers)
+        return FetchResult(url, response.content, True, CaseInsensitiveDict(response.headers).get('ETag'))
+
+    # Duplicate urls wait for the request already in flight instead of sending their own
+    def fetch_async(self, url):
+        if url not in self._in_flight:
+            self._in_flight[url] = asyncio.ensure_future(self._fetch_async(url))
+        return asyncio.shield(self._in_flight[url])
+
+    async def fetch_many_async(self, urls, return_exceptions=False):
+        # Loop-bound state is created for each batch, batches run in their own event loop
+        self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        self._in_flight = {}
+        if hasattr(self._transport, 'open'):
+            await self._transport.open()
+        try:
+            results = await asyncio.gather(*[self.fetch_async(url) for url in urls], return_exceptions=True)
+        finally:
+            if hasattr(self._transport, 'open'):
+                await self._transport.close()
+
+        # Like PageFetcher, only request errors can be returned in place of a page
+        for result in results:
+            if isinstance(result, BaseException) and not (return_exceptions and isinstance(result, requests.RequestException)):
+                raise result
+        return results
+
+    def fetch_many(self, urls, return_exceptions=False):
+        return asyncio.run(self.fetch_many_async(urls, return_exceptions))
+
+    def fetch(self, url):
+        return self.fetch_many([url])[0]
+
+    def close(self):
+        # Sessions are closed at the end of each batch
+        if not hasattr(self._transport, 'open'):
+            self._transport.close()
+
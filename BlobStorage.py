@@ -0,0 +1,73 @@
+from concurrent.futures import ThreadPoolExecutor
+import base64
+import json
+import os
+import re
+
+
+# Blobs larger than this are uploaded as separately staged blocks
+BLOCK_UPLOAD_THRESHOLD = 4 * 1024 * 1024
+BLOCK_SIZE = 4 * 1024 * 1024
+
+
+class AzureBlobStorage:
+    def __init__(self, connection_string, container_name, max_block_workers=4):
+        # Imported here so that the local backend does not need the Azure SDK
+        from azure.storage.blob import BlobServiceClient
+
+        connection_string = re.sub(r'%2B', '+', connection_string)
+        self._container_client = BlobServiceClient.from_connection_string(connection_string).get_container_client(container_name)
+        self._max_block_workers = max_block_workers
+
+    # Metadata of the blob, None when the blob does not exist yet
+    def get_metadata(self, name):
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            return self._container_client.get_blob_client(name).get_blob_properties().metadata
+        except ResourceNotFoundError:
+            return None
+
+    def upload(self, name, data, metadata):
+        blob_client = self._container_client.get_blob_client(name)
+        if len(data) <= BLOCK_UPLOAD_THRESHOLD:
+            blob_client.upload_blob(data, blob_type="BlockBlob", overwrite=True, metadata=metadata)
+            return
+
+        from azure.storage.blob import BlobBlock
+
+        # Blocks are staged concurrently, the blob only changes when the block list is committed
+        offsets = range(0, len(data), BLOCK_SIZE)
+        block_ids = [base64.b64encode(f"{i:08d}".encode()).decode() for i in range(len(offsets))]
+
+        def stage_block(block_id, offset):
+            blob_client.stage_block(block_id, data[offset:offset + BLOCK_SIZE])
+
+        with ThreadPoolExecutor(max_workers=self._max_block_workers) as executor:
+            list(executor.map(stage_block, block_ids, offsets))
+        blob_client.commit_block_list([BlobBlock(block_id=block_id) for block_id in block_ids], metadata=metadata)
+
+
+class FileSystemStorage:
+    # Local stand-in for a blob container, each blob has its metadata in a sidecar JSON file
+    def __init__(self, root):
+        self._root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _get_paths(self, name):
+        path = os.path.join(self._root, name)
+        return path, f"{path}.metadata.json"
+
+    def get_metadata(self, name):
+        path, metadata_path = self._get_paths(name)
+        if not os.path.exists(path) or not os.path.exists(metadata_path):
+            return None
+        with open(metadata_path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+    def upload(self, name, data, metadata):
+        path, metadata_path = self._get_paths(name)
+        with open(path, 'wb') as file:
+            file.write(data)
+        with open(metadata_path, 'w', encoding='utf-8') as file:
+            json.dump(metadata, file)
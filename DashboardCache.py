@@ -0,0 +1,83 @@
+from collections import namedtuple
+import threading
+import logging
+
+
+# Data served to every session: the version (ETag) of each table, the tables and what was built
+# from them. A snapshot is never modified, a refresh builds a new one and swaps it.
+Snapshot = namedtuple('Snapshot', ['versions', 'tables', 'value'])
+
+
+class DashboardCache:
+    # Single in-process copy of the dashboard data, shared by all sessions.
+    # - get_versions() returns the current version of each table (e.g. the ETag of its blob)
+    # - load_tables(names) returns the named tables
+    # - build(tables) creates what the pages use from the tables
+    # The first get() loads everything. A background thread then checks the versions every
+    # 'ttl' seconds and reloads only the tables that changed, sessions keep reading the previous
+    # snapshot until the new one is ready.
+    def __init__(self, get_versions, load_tables, build, ttl=60):
+        self._get_versions = get_versions
+        self._load_tables = load_tables
+        self._build = build
+        self._ttl = ttl
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def versions(self):
+        return self._snapshot.versions if self._snapshot is not None else None
+
+    def get(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._refresh()
+                    self._start()
+            snapshot = self._snapshot
+        return snapshot.value
+
+    # Builds a new snapshot when a version changed. Returns the names of the reloaded tables.
+    def refresh(self):
+        with self._lock:
+            return self._refresh()
+
+    def _refresh(self):
+        versions = self._get_versions()
+        previous = self._snapshot
+        if previous is None:
+            changed = list(versions)
+        else:
+            changed = [name for name, version in versions.items() if previous.versions.get(name) != version]
+        if not changed:
+            return []
+
+        tables = dict(previous.tables) if previous is not None else {}
+        tables.update(self._load_tables(changed))
+        self._snapshot = Snapshot(versions, tables, self._build(tables))
+        return changed
+
+    def _start(self):
+        if self._ttl is not None and self._thread is None:
+            self._thread = threading.Thread(target=self._poll, name='dashboard-cache-refresh', daemon=True)
+            self._thread.start()
+
+    def _poll(self):
+        logger = logging.getLogger('__dashboard_cache__')
+        logger.setLevel(logging.INFO)
+        while not self._stop.wait(self._ttl):
+            # A failed refresh keeps the current snapshot, the next poll tries again
+            try:
+                changed = self.refresh()
+                if changed:
+                    logger.info(f"Dashboard data refreshed: {', '.join(changed)}")
+            except Exception:
+                logger.exception("Dashboard data refresh failed")
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -1,8 +1,26 @@
 import polars as pl
+import numpy as np
+import functools
+
+
+# Results are computed once per set of tables and arguments. The tables are only read, so
+# the same result can be served to every session; update() forgets them.
+def memoized(method):
+    @functools.wraps(method)
+    def wrapper(self, *args):
+        key = (method.__name__, args)
+        if key not in self._results:
+            self._results[key] = method(self, *args)
+        return self._results[key]
+    return wrapper
+
 
 class DataExtractor:
+    # aggregates_df is the DashboardAggregates table published by the pipeline. When it is
+    # given the KPIs, league counts, position values and tournament stats are read from it,
+    # otherwise they are computed from the other tables.
     def __init__(self, players_df, nations_df, clubs_df, fixtures_df,
-                 outcomes_df, games_df, past_games_df):
+                 outcomes_df, games_df, past_games_df, aggregates_df=None):
 
         self._players_df = players_df
         self._nations_df = nations_df
@@ -11,9 +29,41 @@ class DataExtractor:
         self._outcomes_df = outcomes_df
         self._games_df = games_df
         self._past_games_df = past_games_df
-
+        self._aggregates_df = aggregates_df
+        self._results = {}
+
+    # Replace some of the tables (e.g. update(outcomes_df=df)), results computed from the
+    # previous tables are dropped
+    def update(self, **tables):
+        for name, df in tables.items():
+            if not hasattr(self, f"_{name}"):
+                raise TypeError(f"Unknown table '{name}'")
+            setattr(self, f"_{name}", df)
+        self._results = {}
+
+    # Players with the columns of their club, shared by the player KPIs
+    @memoized
+    def _get_players_clubs(self):
+        return self._players_df.join(self._clubs_df, on='ClubID', how='left')
+
+    # Name -> value of one section of the precomputed aggregates
+    @memoized
+    def _get_aggregates(self, section):
+        df = self._aggregates_df.filter(pl.col('Section') == section)
+        return dict(zip(df['Name'].to_list(), df['Value'].to_list()))
+
+    # Outcome probabilities of each fixture, by (HomeTeam, AwayTeam)
+    @memoized
+    def _get_outcome_index(self):
+        return {(row[0], row[1]): list(row[2:]) for row in self._outcomes_df.iter_rows()}
+
+    @memoized
     def get_kpis(self):
-        df = self._players_df.join(self._clubs_df, on='ClubID', how='left')
+        if self._aggregates_df is not None:
+            kpis = self._get_aggregates('Kpi')
+            return int(kpis['BestClubPlayers']), int(kpis['TopLeaguePlayers']), kpis['AverageAge'], kpis['AverageNationMarketValue']
+
+        df = self._get_players_clubs()
 
         best_club_nb_players = (df['BestClub']).sum() # OK
         top_league_nb_players = (df['TopLeague']).sum() # OK
@@ -24,8 +74,14 @@ class DataExtractor:
 
         return best_club_nb_players, top_league_nb_players, avg_age_players, avg_nation_market_vakue
 
+    @memoized
     def get_number_of_player_per_top_league(self):
-        df = self._players_df.join(self._clubs_df, on='ClubID', how='left')
+        if self._aggregates_df is not None:
+            counts = self._get_aggregates('PlayersPerLeague')
+            grouped_df = pl.DataFrame({'Country': list(counts), 'PlayerCount': [int(count) for count in counts.values()]})
+            return grouped_df.sort(by='PlayerCount', descending=False)
+
+        df = self._get_players_clubs()
 
         # Group by 'TopLeague' and count the players
         grouped_df = df.group_by('Country').agg(pl.count('PlayerID').alias('PlayerCount'))
@@ -42,27 +98,37 @@ class DataExtractor:
 
         return grouped_df.sort(by='PlayerCount', descending=False)
 
+    @memoized
     def get_ranking_per_nation(self):
         nations_ranking = self._nations_df.select('Nationality', 'NationRanking')
         nations_ranking = nations_ranking.rename({'Nationality': 'Nation', 'NationRanking': 'Nation Ranking'})
         return nations_ranking.sort(by='Nation Ranking', descending=False)
 
+    @memoized
     def get_market_value_per_nation(self):
         df = self._nations_df.select('Nationality', 'SumMarketValue')
         df = df.rename({'Nationality': 'Nation', 'SumMarketValue': 'MarketValue'})
         return df.sort(by='MarketValue', descending=True)
 
+    @memoized
     def get_market_value_per_position(self):
-        df = self._players_df.groupby('Position').agg(pl.mean('MarketValue').alias('MarketValue'))
+        if self._aggregates_df is not None:
+            values = self._get_aggregates('MarketValuePerPosition')
+            df = pl.DataFrame({'Position': list(values), 'MarketValue': list(values.values())})
+            return df.sort(by='MarketValue', descending=True)
+
+        df = self._players_df.group_by('Position').agg(pl.mean('MarketValue').alias('MarketValue'))
         df = df.with_columns(df['MarketValue'].round(decimals=1))
         return df.sort(by='MarketValue', descending=True)
 
+    @memoized
     def get_average_age_cap(self):
         df = self._nations_df.select('Nationality', 'AgeAverage', 'AverageCap')
         df = df.with_columns(df['AgeAverage'].round(decimals=2))
         df = df.with_columns(df['AverageCap'].round(decimals=2))
         return df
 
+    @memoized
     def get_result_of_the_competiton(self):
         df = self._games_df.with_columns([
             self._games_df["HomeTeamGoal"].cast(pl.Utf8),
@@ -72,7 +138,12 @@ class DataExtractor:
         df = df.with_columns(pl.concat_str([pl.col('HomeTeamGoal'), pl.lit(" - "), pl.col('AwayTeamGoal')]).alias('Result'))
         return df.select('Date', 'HomeTeam', 'AwayTeam', 'Result')
 
+    @memoized
     def get_tournament_info(self):
+        if self._aggregates_df is not None:
+            info = self._get_aggregates('Tournament')
+            return [int(info['Games']), int(info['Goals']), info['AverageGoals'], int(info['Wins']), int(info['Draws'])]
+
         nb_games = self._games_df.shape[0]
         nb_goals = self._games_df['HomeTeamGoal'].sum() + self._games_df['AwayTeamGoal'].sum()
         avg_goals = nb_goals / nb_games
@@ -80,27 +151,64 @@ class DataExtractor:
         nb_wins = nb_games - nb_draws
         return [nb_games, nb_goals, avg_goals, nb_wins, nb_draws]
 
+    @memoized
     def get_fixtures_info(self):
-        df = self._fixtures_df.with_columns(pl.concat_str([pl.col('Date'), pl.lit(" : "), pl.col('HomeTeam'), pl.lit(' vs '), pl.col('AwayTeam')]).alias('NextFixtures'))
-        results = df.select('NextFixtures').to_series().to_list()
-        home_teams = df.select('HomeTeam').to_series().to_list()
-        away_teams = df.select('AwayTeam').to_series().to_list()
-        return results, home_teams, away_teams
+        df = self._fixtures_df.select(
+            pl.concat_str([pl.col('Date'), pl.lit(" : "), pl.col('HomeTeam'), pl.lit(' vs '), pl.col('AwayTeam')]).alias('NextFixtures'),
+            'HomeTeam', 'AwayTeam'
+        )
+        return df['NextFixtures'].to_list(), df['HomeTeam'].to_list(), df['AwayTeam'].to_list()
 
     def get_fixtures_predictions(self, home_team_name, away_team_name):
-        fixture = self._outcomes_df.filter((pl.col('HomeTeam') == home_team_name) & (pl.col('AwayTeam') == away_team_name))
-        return fixture.to_numpy().tolist()[0][2:]
+        return list(self._get_outcome_index()[(home_team_name, away_team_name)])
 
-    def past_games(self, home_team, away_team):
-        df = self._past_games_df.filter(pl.col('HomeTeam').is_in([home_team, away_team]) &  pl.col('AwayTeam').is_in([home_team, away_team]))
-        df = df.with_columns(pl.concat_str([pl.col('Date'), pl.lit(" : "), pl.col('HomeTeam'), pl.lit(' vs '), pl.col('AwayTeam')]).alias('NextFixtures'))
+    # Past games sorted by date with their display columns, and the offsets of the games of each
+    # pair of teams in that table, keyed on the pair in alphabetical order
+    @memoized
+    def _get_head_to_head_index(self):
+        df = self._past_games_df.with_row_index('Offset').sort(
+            pl.col('Date').str.strptime(pl.Date, '%d/%m/%Y'), 'Offset'
+        ).drop('Offset')
 
         df = df.with_columns(
             pl.when(pl.col('SpecialWinConditions').is_not_null())
             .then(pl.col('Stage') + pl.lit(' : ') + pl.col('SpecialWinConditions'))
             .otherwise(pl.col('Stage'))
-            .alias('Phase')
+            .alias('Phase'),
+            pl.concat_str([pl.col('HomeTeamGoal'), pl.lit(" - "), pl.col('AwayTeamGoal')]).alias('Result'),
+            pl.when(pl.col('HomeTeam') < pl.col('AwayTeam')).then(pl.col('HomeTeam')).otherwise(pl.col('AwayTeam')).alias('FirstTeam'),
+            pl.when(pl.col('HomeTeam') < pl.col('AwayTeam')).then(pl.col('AwayTeam')).otherwise(pl.col('HomeTeam')).alias('SecondTeam')
         )
 
-        df = df.with_columns(pl.concat_str([pl.col('HomeTeamGoal'), pl.lit(" - "), pl.col('AwayTeamGoal')]).alias('Result'))
-        return df.select('Date', 'HomeTeam', 'AwayTeam', 'Result', 'Phase')
+        pairs = df.with_row_index('Offset').group_by('FirstTeam', 'SecondTeam').agg(pl.col('Offset').sort())
+        index = {(first, second): offsets for first, second, offsets in pairs.iter_rows()}
+        return df.select('Date', 'HomeTeam', 'AwayTeam', 'Result', 'Phase', 'HomeTeamGoal', 'AwayTeamGoal'), index
+
+    def _get_head_to_head_games(self, home_team, away_team):
+        df, index = self._get_head_to_head_index()
+        return df.select(pl.all().gather(index.get(tuple(sorted([home_team, away_team])), [])))
+
+    def past_games(self, home_team, away_team):
+        return self._get_head_to_head_games(home_team, away_team).select('Date', 'HomeTeam', 'AwayTeam', 'Result', 'Phase')
+
+    # Scored past games between the two teams, from the home team's side:
+    # [games, home team wins, draws, away team wins, home team goals, away team goals]
+    def get_head_to_head_summary(self, home_team, away_team):
+        # Games without a score (null or NaN goals) are left out of every count
+        df = self._get_head_to_head_games(home_team, away_team).with_columns(
+            pl.col('HomeTeamGoal', 'AwayTeamGoal').cast(pl.Float64).fill_nan(None)
+        ).drop_nulls(['HomeTeamGoal', 'AwayTeamGoal'])
+        is_home = (df['HomeTeam'] == home_team).to_numpy()
+        home_goals, away_goals = df['HomeTeamGoal'].to_numpy(), df['AwayTeamGoal'].to_numpy()
+
+        # Goals of the home team of the fixture, wherever the game was played
+        goals_for = np.where(is_home, home_goals, away_goals)
+        goals_against = np.where(is_home, away_goals, home_goals)
+        return [
+            df.shape[0],
+            int(np.sum(goals_for > goals_against)),
+            int(np.sum(goals_for == goals_against)),
+            int(np.sum(goals_for < goals_against)),
+            int(np.sum(goals_for)),
+            int(np.sum(goals_against))
+        ]
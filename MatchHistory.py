@@ -0,0 +1,174 @@
+import pandas as pd
+import numpy as np
+import threading
+import hashlib
+import json
+import os
+import storage
+from TeamStrengthIndex import TeamStrengthIndex, VENUES
+from weighting import DEFAULT_DECAY, DEFAULT_KERNEL, KERNELS, YEAR_KERNELS, add_weights
+
+
+HISTORY_FOLDER = 'MatchHistory'
+KEY_COLUMNS = ['Date', 'HomeTeam', 'AwayTeam']
+GAME_COLUMNS = KEY_COLUMNS + ['HomeTeamGoal', 'AwayTeamGoal']
+AGGREGATE_COLUMNS = ['Team', 'Venue', 'Games', 'Scored', 'Conceded']
+
+# Every partition is written with the same column types, whatever the games it holds, so that a
+# scan of all partitions sees one schema. Goals stay float32 as some may be missing, and teams are
+# plain strings as the categories of each partition differ.
+PARTITION_DTYPES = {'Date': 'datetime64[ns]', 'HomeTeam': 'string', 'AwayTeam': 'string', 'HomeTeamGoal': 'float32', 'AwayTeamGoal': 'float32'}
+
+# Stages of the same run share the store, appends are serialised
+_APPEND_LOCK = threading.Lock()
+
+
+# Content hash of the games of a frame, independent of their order in the frame
+def hash_games(df):
+    hashes = pd.util.hash_pandas_object(df[GAME_COLUMNS].astype(str), index=False).to_numpy(dtype=np.uint64)
+    return hashlib.sha256(np.sort(hashes).tobytes()).hexdigest()
+
+
+def to_partition_frame(df):
+    return storage.apply_schema(df[GAME_COLUMNS], 'Game').astype(PARTITION_DTYPES)
+
+
+# Rows of the frames that are not replaced by a later row of the same game (same date and
+# teams), in this frame or a later one, as append keeps them. Returns one frame per frame given.
+def drop_duplicate_games(dfs):
+    key_dtypes = {column: PARTITION_DTYPES[column] for column in KEY_COLUMNS}
+    keys_df = pd.concat([storage.apply_schema(df[KEY_COLUMNS], 'Game').astype(key_dtypes) for df in dfs], ignore_index=True)
+    is_kept = ~keys_df.duplicated(keep='last').to_numpy()
+    bounds = np.cumsum([0] + [len(df) for df in dfs])
+    return [df[is_kept[start:end]] for df, start, end in zip(dfs, bounds[:-1], bounds[1:])]
+
+
+# Unweighted goal sums of each team at each venue, games with a missing score still count as played
+def get_aggregates(df):
+    aggregates = []
+    for venue_id, venue in enumerate(VENUES):
+        opponent_venue = VENUES[1 - venue_id]
+        venue_df = pd.DataFrame({
+            'Team': df[venue + 'Team'].astype(object),
+            'Scored': df[venue + 'TeamGoal'].astype(float),
+            'Conceded': df[opponent_venue + 'TeamGoal'].astype(float)
+        })
+        sums = venue_df.groupby('Team').agg(Games=('Scored', 'size'), Scored=('Scored', 'sum'), Conceded=('Conceded', 'sum'))
+        aggregates.append(sums.reset_index().assign(Venue=venue))
+    return pd.concat(aggregates, ignore_index=True)[AGGREGATE_COLUMNS]
+
+
+class MatchHistory:
+    # Append-only store of the games played, one partition per edition (calendar year). Each
+    # partition keeps its games and the per-team aggregates of those games, so the team strength
+    # index of a year-based kernel is merged from a few rows per partition instead of every game.
+    def __init__(self, root=None, file_format=None):
+        self._root = root or storage.get_dataset_path(HISTORY_FOLDER)
+        self._file_format = file_format or storage.DEFAULT_FORMAT
+        self._manifest_file = f"{self._root}/Manifest.json"
+
+    def _get_partition_path(self, year, name):
+        return f"{self._root}/Year={year}/{name}.{self._file_format}"
+
+    def _load_manifest(self):
+        if not os.path.exists(self._manifest_file):
+            return {'Sources': {}}
+        with open(self._manifest_file, 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+    def _save_manifest(self, manifest):
+        os.makedirs(self._root, exist_ok=True)
+        with open(self._manifest_file, 'w', encoding='utf-8') as file:
+            json.dump(manifest, file)
+
+    @property
+    def years(self):
+        if not os.path.exists(self._root):
+            return []
+        return sorted(int(folder.split('=')[1]) for folder in os.listdir(self._root)
+                      if folder.startswith('Year=') and os.path.exists(self._get_partition_path(folder.split('=')[1], 'Games')))
+
+    def _read_partition(self, year, name):
+        df = storage.read_frame(self._get_partition_path(year, name))
+        return storage.apply_schema(df, 'Game') if name == 'Games' else df
+
+    # Adds the games to their partitions, a game already stored (same date and teams) is replaced.
+    # Appending the same games again changes nothing. When 'source' is given, a frame identical
+    # to the last one appended from that source is skipped without reading the partitions.
+    # Returns the years whose partition changed.
+    def append(self, df, source=None):
+        df = to_partition_frame(df)
+        source_hash = hash_games(df) if source is not None else None
+
+        with _APPEND_LOCK:
+            manifest = self._load_manifest()
+            if source is not None and manifest['Sources'].get(source) == source_hash:
+                return []
+
+            changed_years = []
+            for year, new_df in df.groupby(df['Date'].dt.year):
+                if os.path.exists(self._get_partition_path(year, 'Games')):
+                    previous_df = to_partition_frame(self._read_partition(year, 'Games'))
+                    partition_df = pd.concat([previous_df, new_df], ignore_index=True)
+                    partition_df = partition_df.drop_duplicates(subset=KEY_COLUMNS, keep='last')
+                    if hash_games(partition_df) == hash_games(previous_df):
+                        continue
+                else:
+                    partition_df = new_df.drop_duplicates(subset=KEY_COLUMNS, keep='last')
+
+                partition_df = partition_df.sort_values(KEY_COLUMNS, kind='stable').reset_index(drop=True)
+                storage.write_frame(partition_df, self._get_partition_path(year, 'Games'))
+                storage.write_frame(get_aggregates(partition_df), self._get_partition_path(year, 'Aggregates'))
+                changed_years.append(int(year))
+
+            if source is not None:
+                manifest['Sources'][source] = source_hash
+                self._save_manifest(manifest)
+        return changed_years
+
+    def read_games(self, years=None):
+        years = self.years if years is None else years
+        if not years:
+            return pd.DataFrame(columns=GAME_COLUMNS)
+        return pd.concat([self._read_partition(year, 'Games') for year in years], ignore_index=True)
+
+    # Lazy scan of every partition, for the polars predictions
+    def scan_games(self):
+        # Imported here so that the pandas readers of the history do not load polars
+        import polars as pl
+
+        pattern = f"{self._root}/Year=*/Games.{self._file_format}"
+        if self._file_format == 'parquet':
+            return pl.scan_parquet(pattern)
+        return pl.scan_csv(pattern).with_columns(pl.col('Date').str.strptime(pl.Datetime, storage.DATE_FORMAT))
+
+    def read_aggregates(self, years=None):
+        years = self.years if years is None else years
+        if not years:
+            return pd.DataFrame(columns=['Year'] + AGGREGATE_COLUMNS)
+        return pd.concat([self._read_partition(year, 'Aggregates').assign(Year=year) for year in years], ignore_index=True)
+
+    # Same index as TeamStrengthIndex.from_games on the weighted games. Year-based kernels weight
+    # the partition aggregates, one weight per edition, other kernels weight every stored game.
+    def get_team_strength_index(self, kernel=DEFAULT_KERNEL, decay=DEFAULT_DECAY, reference_date=None):
+        reference_date = pd.Timestamp(pd.Timestamp.now() if reference_date is None else reference_date)
+        if kernel not in YEAR_KERNELS:
+            return TeamStrengthIndex.from_games(add_weights(self.read_games(), kernel, decay, reference_date))
+
+        aggregates_df = self.read_aggregates()
+        years = pd.Series(self.years)
+        weights = KERNELS[kernel](pd.to_datetime(years.astype(str), format='%Y'), reference_date, decay)
+        weight = aggregates_df['Year'].map(dict(zip(years, weights)))
+
+        sums = pd.DataFrame({
+            'Team': aggregates_df['Team'],
+            'Venue': aggregates_df['Venue'],
+            'WeightSums': weight * aggregates_df['Games'],
+            'ScoredSums': weight * aggregates_df['Scored'],
+            'ConcededSums': weight * aggregates_df['Conceded']
+        }).groupby(['Team', 'Venue']).sum()
+
+        data = {'Teams': list(sums.index.unique('Team'))}
+        for column in ['WeightSums', 'ScoredSums', 'ConcededSums']:
+            data[column] = sums[column].unstack('Venue').reindex(index=data['Teams'], columns=VENUES).fillna(0).to_numpy()
+        return TeamStrengthIndex.from_dict(data)
@@ -0,0 +1,184 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+
+USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/88.0.4324.150 Safari/537.36'
+
+# Status codes worth retrying
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Header names are case-insensitive, servers may send 'etag' as well as 'ETag'
+TransportResponse = namedtuple('TransportResponse', ['status_code', 'headers', 'content'])
+
+# Content of a page, whether it changed since the previous fetch and its ETag when the server sent one
+FetchResult = namedtuple('FetchResult', ['url', 'content', 'modified', 'etag'], defaults=[None])
+
+
+class RequestsTransport:
+    # One connection-pooled session shared by every request
+    def __init__(self, pool_size=10):
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def get(self, url, headers, timeout):
+        response = self._session.get(url, headers=headers, timeout=timeout)
+        return TransportResponse(response.status_code, response.headers, response.content)
+
+    def close(self):
+        self._session.close()
+
+
+class FileTransport:
+    # Serves saved HTML pages instead of the network, for offline runs. Pages get an ETag
+    # computed from their content so that conditional requests behave like a real server.
+    def __init__(self, pages):
+        self._pages = pages
+
+    def get(self, url, headers, timeout):
+        if url not in self._pages:
+            return TransportResponse(404, CaseInsensitiveDict(), b'')
+        with open(self._pages[url], 'rb') as file:
+            content = file.read()
+
+        etag = '"' + hashlib.sha256(content).hexdigest() + '"'
+        if headers.get('If-None-Match') == etag:
+            return TransportResponse(304, CaseInsensitiveDict({'ETag': etag}), b'')
+        return TransportResponse(200, CaseInsensitiveDict({'ETag': etag, 'Last-Modified': formatdate(usegmt=True)}), content)
+
+    def close(self):
+        pass
+
+
+# Validators of a cached page after a 304, those sent again by the server replace the cached ones
+def get_not_modified_headers(cached, headers):
+    merged_headers = CaseInsensitiveDict({'ETag': cached['ETag'], 'Last-Modified': cached['LastModified']})
+    merged_headers.update(headers)
+    return merged_headers
+
+
+class RateLimiter:
+    # Spaces requests at least 1 / rate seconds apart, across all the threads sharing it
+    def __init__(self, rate):
+        self._interval = 1 / rate
+        self._lock = threading.Lock()
+        self._next_time = 0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_time - now
+            self._next_time = max(now, self._next_time) + self._interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class PageFetcher:
+    def __init__(self, transport=None, cache_dir=None, ttl=300, timeout=10, max_retries=3, backoff=0.5, max_workers=4, rate_limit=None):
+        self._transport = transport if transport is not None else RequestsTransport(pool_size=max_workers)
+        self._rate_limiter = RateLimiter(rate_limit) if rate_limit else None
+        self._cache_dir = cache_dir
+        self._ttl = ttl
+        self._timeout = timeout
+        self._max_retries = max_retries
+        self._backoff = backoff
+        self._max_workers = max_workers
+
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _get_cache_paths(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self._cache_dir, f"{key}.json"), os.path.join(self._cache_dir, f"{key}.html")
+
+    def _read_cache(self, url):
+        if self._cache_dir is None:
+            return None
+        metadata_path, content_path = self._get_cache_paths(url)
+        if not os.path.exists(metadata_path) or not os.path.exists(content_path):
+            return None
+        with open(metadata_path, 'r', encoding='utf-8') as file:
+            metadata = json.load(file)
+        with open(content_path, 'rb') as file:
+            metadata['Content'] = file.read()
+        return metadata
+
+    def _write_cache(self, url, content, headers):
+        if self._cache_dir is None:
+            return
+        metadata_path, content_path = self._get_cache_paths(url)
+        headers = CaseInsensitiveDict(headers)
+        metadata = {
+            'Url': url,
+            'FetchedAt': time.time(),
+            'ETag': headers.get('ETag'),
+            'LastModified': headers.get('Last-Modified')
+        }
+        if content is not None:
+            with open(content_path, 'wb') as file:
+                file.write(content)
+        with open(metadata_path, 'w', encoding='utf-8') as file:
+            json.dump(metadata, file)
+
+    # Exponential backoff with jitter on network errors and retryable status codes
+    def _get_with_retries(self, url, headers):
+        for attempt in range(self._max_retries + 1):
+            try:
+                if self._rate_limiter is not None:
+                    self._rate_limiter.wait()
+                response = self._transport.get(url, headers, self._timeout)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == self._max_retries:
+                    return response
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self._max_retries:
+                    raise
+            time.sleep(self._backoff * 2 ** attempt * (1 + random.random()))
+
+    def fetch(self, url):
+        cached = self._read_cache(url)
+        if cached is not None and time.time() - cached['FetchedAt'] < self._ttl:
+            return FetchResult(url, cached['Content'], False, cached['ETag'])
+
+        headers = {'User-Agent': USER_AGENT}
+        if cached is not None:
+            if cached['ETag']:
+                headers['If-None-Match'] = cached['ETag']
+            if cached['LastModified']:
+                headers['If-Modified-Since'] = cached['LastModified']
+
+        response = self._get_with_retries(url, headers)
+        if response.status_code == 304 and cached is not None:
+            self._write_cache(url, None, get_not_modified_headers(cached, response.headers))
+            return FetchResult(url, cached['Content'], False, cached['ETag'])
+        if response.status_code >= 400:
+            raise requests.HTTPError(f"{response.status_code} error while fetching {url}")
+
+        self._write_cache(url, response.content, response.headers)
+        return FetchResult(url, response.content, True, CaseInsensitiveDict(response.headers).get('ETag'))
+
+    # All pages are fetched concurrently, results keep the order of the urls. With
+    # return_exceptions, a failed page gives its exception instead of stopping the others.
+    def fetch_many(self, urls, return_exceptions=False):
+        fetch = self._fetch_or_exception if return_exceptions else self.fetch
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            return list(executor.map(fetch, urls))
+
+    def _fetch_or_exception(self, url):
+        try:
+            return self.fetch(url)
+        except requests.RequestException as e:
+            return e
+
+    def close(self):
+        self._transport.close()
@@ -0,0 +1,99 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import pandas as pd
+import numpy as np
+import importlib
+import hashlib
+import json
+import os
+import time
+import logging
+
+
+# A stage calls 'function' ('module.function', imported when the stage runs) with its input
+# tables and gets back the output tables it produced. Tables it does not return are read from
+# disk by the stages needing them. Stages that are not cacheable (scrapers) always run.
+Stage = namedtuple('Stage', ['name', 'function', 'inputs', 'outputs', 'cacheable'], defaults=[True])
+
+
+# Content hash of a table, independent of its index
+def get_fingerprint(df):
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy(dtype=np.uint64)
+    content = json.dumps([list(map(str, df.columns)), list(map(str, df.dtypes))]).encode('utf-8') + hashes.tobytes()
+    return hashlib.sha256(content).hexdigest()
+
+
+class Pipeline:
+    def __init__(self, stages, load_table, state_file=None, max_workers=4):
+        self._stages = {stage.name: stage for stage in stages}
+        self._load_table = load_table
+        self._state_file = state_file
+        self._max_workers = max_workers
+
+        # Each stage waits for the stages producing its inputs, other inputs are read from disk
+        producers = {output: stage.name for stage in stages for output in stage.outputs}
+        self._dependencies = {
+            stage.name: {producers[table] for table in stage.inputs if table in producers}
+            for stage in stages
+        }
+
+    def _load_state(self):
+        if self._state_file is None or not os.path.exists(self._state_file):
+            return {}
+        with open(self._state_file, 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+    def _save_state(self, state):
+        if self._state_file is not None:
+            with open(self._state_file, 'w', encoding='utf-8') as file:
+                json.dump(state, file)
+
+    def _get_table(self, tables, name):
+        if name not in tables:
+            tables[name] = self._load_table(name)
+        return tables[name]
+
+    # Runs one stage, skipped when it is cacheable and its inputs have not changed since its last run
+    def _run_stage(self, stage, tables, state):
+        start = time.perf_counter()
+        inputs = {name: self._get_table(tables, name) for name in stage.inputs}
+
+        fingerprint = None
+        if stage.cacheable:
+            fingerprint = hashlib.sha256(''.join(get_fingerprint(inputs[name]) for name in stage.inputs).encode()).hexdigest()
+            if state.get(stage.name) == fingerprint:
+                return {}, fingerprint, 'skipped', time.perf_counter() - start
+
+        module_name, function_name = stage.function.rsplit('.', 1)
+        function = getattr(importlib.import_module(module_name), function_name)
+        outputs = function(tables=inputs) or {}
+        return outputs, fingerprint, 'ran', time.perf_counter() - start
+
+    # Runs every stage once its dependencies are done, independent stages in parallel. Returns
+    # the tables produced by the run and the timing of each stage.
+    def run(self, tables=None):
+        logger = logging.getLogger('__pipeline__')
+        tables = dict(tables or {})
+        state = self._load_state()
+        timings = []
+
+        done, running = set(), {}
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            while len(done) < len(self._stages):
+                for name, stage in self._stages.items():
+                    if name not in done and name not in running.values() and self._dependencies[name] <= done:
+                        running[executor.submit(self._run_stage, stage, tables, state)] = name
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    outputs, fingerprint, status, seconds = future.result()
+                    tables.update(outputs)
+                    if fingerprint is not None:
+                        state[name] = fingerprint
+                        self._save_state(state)
+                    done.add(name)
+                    timings.append({'Stage': name, 'Status': status, 'Seconds': seconds})
+                    logger.info(f"Stage '{name}' {status} in {seconds:.2f}s")
+
+        return tables, pd.DataFrame(timings, columns=['Stage', 'Status', 'Seconds'])
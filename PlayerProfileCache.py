@@ -0,0 +1,73 @@
+import pandas as pd
+import sqlite3
+import time
+
+
+# Profiles older than this are refetched even if their nation did not play, so that friendlies
+# missing from the Game table are eventually picked up
+MAX_AGE_DAYS = 30
+
+SECONDS_PER_DAY = 24 * 3600
+
+
+class PlayerProfileCache:
+    # Caps and goals of each player, with when and under which ETag the profile was fetched
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS Profile ("
+            "PlayerID TEXT PRIMARY KEY, Cap INTEGER, Goal INTEGER, FetchedAt REAL, ETag TEXT)"
+        )
+        self._connection.commit()
+
+    def get_profiles(self):
+        return pd.read_sql_query("SELECT PlayerID, Cap, Goal, FetchedAt, ETag FROM Profile", self._connection)
+
+    def get_etags(self, player_ids):
+        profiles_df = self.get_profiles()
+        profiles_df = profiles_df[profiles_df['PlayerID'].isin(player_ids)]
+        return dict(zip(profiles_df['PlayerID'], profiles_df['ETag']))
+
+    # rows are (PlayerID, Cap, Goal, ETag), all stamped with the same fetch time
+    def update_profiles(self, rows, fetched_at=None):
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO Profile (PlayerID, Cap, Goal, FetchedAt, ETag) VALUES (?, ?, ?, ?, ?)",
+            [(player_id, cap, goal, fetched_at, etag) for player_id, cap, goal, etag in rows]
+        )
+        self._connection.commit()
+
+    # Only the fetch time changes, for profiles found unchanged
+    def touch_profiles(self, player_ids, fetched_at=None):
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        self._connection.executemany(
+            "UPDATE Profile SET FetchedAt = ? WHERE PlayerID = ?",
+            [(fetched_at, player_id) for player_id in player_ids]
+        )
+        self._connection.commit()
+
+    # Players to refetch: never fetched, fetched more than max_age_days ago, or whose nation
+    # played on or after the day of their last fetch. players_df has PlayerID and Nationality,
+    # games_df is the Game table, whose team names are the nationalities.
+    def get_stale_players(self, players_df, games_df, now=None, max_age_days=MAX_AGE_DAYS):
+        now = time.time() if now is None else now
+        players_df = players_df[['PlayerID', 'Nationality']].merge(
+            self.get_profiles()[['PlayerID', 'FetchedAt']], on='PlayerID', how='left'
+        )
+
+        game_dates = pd.to_datetime(games_df['Date'], format='%d/%m/%Y')
+        last_games = pd.concat([
+            pd.DataFrame({'Nationality': games_df['HomeTeam'], 'Date': game_dates}),
+            pd.DataFrame({'Nationality': games_df['AwayTeam'], 'Date': game_dates})
+        ]).groupby('Nationality')['Date'].max()
+
+        fetched_days = pd.to_datetime(players_df['FetchedAt'], unit='s').dt.normalize()
+        is_stale = (
+            players_df['FetchedAt'].isna()
+            | (now - players_df['FetchedAt'] > max_age_days * SECONDS_PER_DAY)
+            | (players_df['Nationality'].map(last_games) >= fetched_days)
+        )
+        return players_df.loc[is_stale, 'PlayerID'].tolist()
+
+    def close(self):
+        self._connection.close()
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+
+
+VENUES = ['Home', 'Away']
+
+
+class TeamStrengthIndex:
+    # Per-team, per-venue weighted goal sums built from the output of add_weights.
+    # Rows are teams, columns are venues (0 = Home, 1 = Away).
+    def __init__(self):
+        self._team_ids = {}
+        self._weight_sums = np.zeros((0, len(VENUES)))
+        self._scored_sums = np.zeros((0, len(VENUES)))
+        self._conceded_sums = np.zeros((0, len(VENUES)))
+
+    @classmethod
+    def from_games(cls, df):
+        team_strength_index = cls()
+        team_strength_index.add_games(df)
+        return team_strength_index
+
+    @classmethod
+    def from_dict(cls, data):
+        team_strength_index = cls()
+        team_strength_index._team_ids = {team: i for i, team in enumerate(data['Teams'])}
+        team_strength_index._weight_sums = np.array(data['WeightSums'], dtype=float).reshape(-1, len(VENUES))
+        team_strength_index._scored_sums = np.array(data['ScoredSums'], dtype=float).reshape(-1, len(VENUES))
+        team_strength_index._conceded_sums = np.array(data['ConcededSums'], dtype=float).reshape(-1, len(VENUES))
+        return team_strength_index
+
+    def to_dict(self):
+        return {
+            'Teams': self.teams,
+            'WeightSums': self._weight_sums.tolist(),
+            'ScoredSums': self._scored_sums.tolist(),
+            'ConcededSums': self._conceded_sums.tolist()
+        }
+
+    @property
+    def teams(self):
+        return list(self._team_ids)
+
+    def _get_team_ids(self, teams):
+        new_teams = [team for team in teams if team not in self._team_ids]
+        if new_teams:
+            for team in new_teams:
+                self._team_ids[team] = len(self._team_ids)
+            padding = np.zeros((len(new_teams), len(VENUES)))
+            self._weight_sums = np.vstack([self._weight_sums, padding])
+            self._scored_sums = np.vstack([self._scored_sums, padding])
+            self._conceded_sums = np.vstack([self._conceded_sums, padding])
+        return np.array([self._team_ids[team] for team in teams], dtype=int)
+
+    # Add weighted games (e.g. new rows of Game.csv) without rebuilding the index
+    def add_games(self, df):
+        for venue_id, venue in enumerate(VENUES):
+            opponent_venue = VENUES[1 - venue_id]
+            weighted_df = pd.DataFrame({
+                'Team': df[venue + 'Team'],
+                'Weight': df['Weight'],
+                'Scored': df['Weight'] * df[venue + 'TeamGoal'],
+                'Conceded': df['Weight'] * df[opponent_venue + 'TeamGoal']
+            })
+            sums = weighted_df.groupby('Team', observed=True)[['Weight', 'Scored', 'Conceded']].sum()
+
+            team_ids = self._get_team_ids(sums.index)
+            self._weight_sums[team_ids, venue_id] += sums['Weight'].to_numpy()
+            self._scored_sums[team_ids, venue_id] += sums['Scored'].to_numpy()
+            self._conceded_sums[team_ids, venue_id] += sums['Conceded'].to_numpy()
+
+    # Weighted average goals scored and conceded by a team at a venue ('Home' or 'Away')
+    def get_averages(self, team, home_or_away):
+        team_id = self._team_ids.get(team)
+        if team_id is None:
+            return np.nan, np.nan
+        venue_id = VENUES.index(home_or_away)
+        weight_sum = self._weight_sums[team_id, venue_id]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (self._scored_sums[team_id, venue_id] / weight_sum,
+                    self._conceded_sums[team_id, venue_id] / weight_sum)
+
+    def get_team_averages(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scored = self._scored_sums / self._weight_sums
+            conceded = self._conceded_sums / self._weight_sums
+
+        return pd.DataFrame({
+            'HomeScored': scored[:, 0],
+            'HomeConceded': conceded[:, 0],
+            'AwayScored': scored[:, 1],
+            'AwayConceded': conceded[:, 1]
+        }, index=self.teams)
+
+    # Expected goals of the home and away sides of each fixture, as predict_goals computes them
+    def get_rates(self, home_teams, away_teams):
+        team_averages = self.get_team_averages()
+        home_averages = team_averages.reindex(home_teams)
+        away_averages = team_averages.reindex(away_teams)
+
+        home_rates = home_averages['HomeScored'].to_numpy() * away_averages['HomeConceded'].to_numpy()
+        away_rates = away_averages['AwayScored'].to_numpy() * home_averages['AwayConceded'].to_numpy()
+        return home_rates, away_rates
@@ -1,11 +1,13 @@
 import re
 import streamlit as st
-import pandas as pd
 import polars as pl
 from PIL import Image
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 from azure.storage.blob import BlobServiceClient
 from azure.storage.blob import ContainerClient
+from azure.core.exceptions import ResourceNotFoundError
+from DashboardCache import DashboardCache
 from DataExtractor import DataExtractor
 from Visualizer import Visualizer
 
@@ -24,6 +26,25 @@ st.set_page_config(
 CONCAF_LOGO = Image.open('pictures/logo_team.png')
 WIDTH_LOGO = 3000
 
+# Columns read from each table, the ones used by DataExtractor. None reads every column, the
+# predictions are read by position.
+DASHBOARD_COLUMNS = {
+    'Player': ['PlayerID', 'Age', 'Position', 'MarketValue', 'ClubID'],
+    'Nation': ['Nationality', 'NationRanking', 'SumMarketValue', 'AgeAverage', 'AverageCap'],
+    'Club': ['ClubID', 'Country', 'BestClub', 'TopLeague'],
+    'Fixture': ['Date', 'HomeTeam', 'AwayTeam'],
+    'Outcome': None,
+    'Game': ['Date', 'HomeTeam', 'AwayTeam', 'HomeTeamGoal', 'AwayTeamGoal'],
+    'PastGames': ['Date', 'HomeTeam', 'AwayTeam', 'HomeTeamGoal', 'AwayTeamGoal', 'Stage', 'SpecialWinConditions'],
+    'DashboardAggregates': None
+}
+
+# Tables the dashboard can do without, until the pipeline has published them
+OPTIONAL_DATASETS = ['DashboardAggregates']
+
+# Seconds between two checks of the blobs for new data
+DATA_TTL = 60
+
 # size of the white space above the title
 reduce_header_height_style = """
     <style>
@@ -55,44 +76,51 @@ def create_blob_client_with_connection_string(connection_string):
     return blob_service_client
 
 
-def download_parquet(container_client, blob_name):
+# Parquet read straight into polars, only the given columns are decoded
+def download_parquet(container_client, blob_name, columns=None):
     blob_client = container_client.get_blob_client(blob=blob_name)
-    download_stream = blob_client.download_blob()
-    stream = BytesIO()
-    download_stream.readinto(stream)
-    df = pd.read_parquet(stream, engine='pyarrow')
-    return df
-
-
-def extract_dataset(connection_string, container_name):
-    blob_service_client = create_blob_client_with_connection_string(connection_string)
-    container_client = blob_service_client.get_container_client(container_name)
-
-    datasets = {
-        'Club': None,
-        'Fixture': None,
-        'Game': None,
-        'Nation': None,
-        'Outcome': None,
-        'PastGames': None,
-        'Player': None
-    }
+    stream = BytesIO(blob_client.download_blob().readall())
+    return pl.read_parquet(stream, columns=columns)
 
-    for blob in container_client.list_blobs() :
-        for dataset in datasets:
-            if (blob.name.startswith(dataset)):
-                df = download_parquet(container_client, blob.name)
-                datasets[dataset] = pl.from_pandas(df)
 
-    return datasets['Player'], datasets['Nation'], datasets['Club'], datasets['Fixture'], datasets['Outcome'], datasets['Game'],  datasets['PastGames']
+# None when an optional table has not been published yet
+def download_dataset(container_client, dataset):
+    try:
+        return download_parquet(container_client, f"{dataset}.parquet", DASHBOARD_COLUMNS[dataset])
+    except ResourceNotFoundError:
+        if dataset not in OPTIONAL_DATASETS:
+            raise
+        return None
 
-@st.cache_data
-def initialize_classes(connection_string, container_name):
 
-    players_df, nations_df, clubs_df, fixtures_df, outcomes_df, games_df, past_games_df = extract_dataset(connection_string, container_name)
+# Tables are downloaded concurrently from the blobs written by push_data_to_cloud ('<table>.parquet')
+def extract_dataset(container_client, datasets):
+    with ThreadPoolExecutor(max_workers=len(datasets)) as executor:
+        futures = {dataset: executor.submit(download_dataset, container_client, dataset) for dataset in datasets}
+        return {dataset: future.result() for dataset, future in futures.items()}
+
+
+# ETag of the blob of each table, it changes whenever the table is uploaded again
+def get_blob_versions(container_client):
+    def get_etag(dataset):
+        try:
+            return container_client.get_blob_client(blob=f"{dataset}.parquet").get_blob_properties().etag
+        except ResourceNotFoundError:
+            if dataset not in OPTIONAL_DATASETS:
+                raise
+            return None
+
+    with ThreadPoolExecutor(max_workers=len(DASHBOARD_COLUMNS)) as executor:
+        return dict(zip(DASHBOARD_COLUMNS, executor.map(get_etag, DASHBOARD_COLUMNS)))
+
+
+def initialize_classes(datasets):
+    players_df, nations_df, clubs_df, fixtures_df, outcomes_df, games_df, past_games_df = (
+        datasets['Player'], datasets['Nation'], datasets['Club'], datasets['Fixture'], datasets['Outcome'], datasets['Game'], datasets['PastGames']
+        )
 
     dataExtractor = DataExtractor(
-        players_df, nations_df, clubs_df, fixtures_df, outcomes_df, games_df, past_games_df
+        players_df, nations_df, clubs_df, fixtures_df, outcomes_df, games_df, past_games_df, datasets['DashboardAggregates']
         )
 
     visualizer = Visualizer(
@@ -101,6 +129,18 @@ def initialize_classes(connection_string, container_name):
 
     return dataExtractor, visualizer
 
+
+# One cache for the whole server, all sessions read the same copy of the data
+@st.cache_resource
+def get_dashboard_cache(connection_string, container_name):
+    container_client = create_blob_client_with_connection_string(connection_string).get_container_client(container_name)
+    return DashboardCache(
+        lambda: get_blob_versions(container_client),
+        lambda datasets: extract_dataset(container_client, datasets),
+        initialize_classes,
+        ttl=DATA_TTL
+        )
+
 @st.cache_data
 def page_title():
     # Custom CSS to inject into the Streamlit interface
@@ -121,9 +161,9 @@ def page_title():
     st.markdown(" ")  # This creates additional space after the title
 
 
-data_extractor, visualizer = initialize_classes(
+data_extractor, visualizer = get_dashboard_cache(
     st.secrets["CONNECTION_STRING"], st.secrets["CONTAINER_NAME"]
-    )
+    ).get()
 
 page = st.sidebar.selectbox(' ', ['Page 1', 'Page 2'])
 
@@ -273,5 +313,31 @@ elif page == 'Page 2':
     with col_6:
         visualizer.odd_circle("More than 3.5 goals", more35, 120, height, font_size, color_1, color_2)
 
+    st.markdown(" ")  # This creates additional space before the head-to-head record
+
+    nb_h2h_games, home_wins, h2h_draws, away_wins, home_goals, away_goals = data_extractor.get_head_to_head_summary(home_team_name, away_team_name)
+    col_1, col_2, col_3, col_4, col_5, col_6 = st.columns(6)
+
+    kpi_font_size = 10
+    kpi_height = 110
+
+    with col_1:
+        visualizer.kpi('Games Between Them', nb_h2h_games, kpi_height, kpi_font_size, background_plot_color, bar_plot_color)
+
+    with col_2:
+        visualizer.kpi(f'{home_team_name} Wins', home_wins, kpi_height, kpi_font_size, background_plot_color, bar_plot_color)
+
+    with col_3:
+        visualizer.kpi('Draws', h2h_draws, kpi_height, kpi_font_size, background_plot_color, bar_plot_color)
+
+    with col_4:
+        visualizer.kpi(f'{away_team_name} Wins', away_wins, kpi_height, kpi_font_size, background_plot_color, bar_plot_color)
+
+    with col_5:
+        visualizer.kpi(f'{home_team_name} Goals', home_goals, kpi_height, kpi_font_size, background_plot_color, bar_plot_color)
+
+    with col_6:
+        visualizer.kpi(f'{away_team_name} Goals', away_goals, kpi_height, kpi_font_size, background_plot_color, bar_plot_color)
+
     data = data_extractor.past_games(home_team_name, away_team_name)
     visualizer.past_games(f'Past Games between {home_team_name} and {away_team_name}', data, width_plot, height_plot, font_size, background_plot_color)
@@ -0,0 +1,173 @@
+import pandas as pd
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import argparse
+import json
+import time
+import logging
+import dixon_coles
+import storage
+from poisson_implementation import MODELS, get_all_final_probabilities, predict_fixtures
+from TeamStrengthIndex import TeamStrengthIndex
+from weighting import DEFAULT_DECAY, DEFAULT_KERNEL, KERNELS, add_weights, parse_dates
+
+
+RESULTS = ['Win', 'Draw', 'Loose']
+CALIBRATION_BINS = np.linspace(0, 1, 11)
+
+
+# Fit on the games played before the edition, then predict every game of the edition.
+# Returns the metrics of the edition and the predicted/observed results of its games.
+def backtest_edition(edition, games_df, model=MODELS[0], kernel=DEFAULT_KERNEL, decay=DEFAULT_DECAY):
+    edition_df = games_df[games_df['Date'].dt.year == edition]
+    edition_start = edition_df['Date'].min()
+    history_df = games_df[games_df['Date'] < edition_start].copy()
+
+    start = time.perf_counter()
+    history_df = add_weights(history_df, kernel, decay, reference_date=edition_start)
+    if model == 'dixon_coles':
+        fitted_model, _ = dixon_coles.fit_dixon_coles(history_df)
+    else:
+        fitted_model = TeamStrengthIndex.from_games(history_df)
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if model == 'dixon_coles':
+        home_teams = edition_df['HomeTeam'].to_numpy()
+        away_teams = edition_df['AwayTeam'].to_numpy()
+        score_matrices = dixon_coles.get_score_matrices(fitted_model, home_teams, away_teams)
+        probabilities_df = get_all_final_probabilities(home_teams, away_teams, score_matrices)
+    else:
+        probabilities_df = predict_fixtures(edition_df, fitted_model)
+    predict_seconds = time.perf_counter() - start
+
+    # Win/Draw/Loose probabilities normalised over the truncated scorelines
+    probabilities = probabilities_df[RESULTS].to_numpy() / 100
+    probabilities = probabilities / probabilities.sum(axis=1, keepdims=True)
+    goal_difference = edition_df['HomeTeamGoal'].to_numpy() - edition_df['AwayTeamGoal'].to_numpy()
+    observed = np.stack([goal_difference > 0, goal_difference == 0, goal_difference < 0], axis=1).astype(float)
+
+    # Games involving a team without history cannot be predicted
+    is_predicted = ~np.isnan(probabilities).any(axis=1)
+    probabilities, observed = probabilities[is_predicted], observed[is_predicted]
+
+    with np.errstate(divide='ignore'):
+        log_losses = -np.log(np.sum(probabilities * observed, axis=1))
+    metrics = {
+        'Edition': int(edition),
+        'Games': int(len(edition_df)),
+        'PredictedGames': int(is_predicted.sum()),
+        'LogLoss': float(log_losses.mean()) if len(log_losses) else None,
+        'Brier': float(np.sum((probabilities - observed) ** 2, axis=1).mean()) if len(log_losses) else None,
+        'FitSeconds': fit_seconds,
+        'PredictSeconds': predict_seconds,
+        'PredictSecondsPerGame': predict_seconds / max(len(edition_df), 1)
+    }
+    return metrics, probabilities, observed
+
+
+# Mean predicted probability against observed frequency, over all results of all games
+def get_calibration_table(probabilities, observed):
+    probabilities, observed = probabilities.ravel(), observed.ravel()
+    bins = np.clip(np.digitize(probabilities, CALIBRATION_BINS) - 1, 0, len(CALIBRATION_BINS) - 2)
+    calibration_df = pd.DataFrame({'Bin': bins, 'Predicted': probabilities, 'Observed': observed})
+    calibration_df = calibration_df.groupby('Bin').agg(
+        Predicted=pd.NamedAgg(column='Predicted', aggfunc='mean'),
+        Observed=pd.NamedAgg(column='Observed', aggfunc='mean'),
+        Count=pd.NamedAgg(column='Observed', aggfunc='count')
+    ).reset_index()
+    calibration_df['BinStart'] = CALIBRATION_BINS[calibration_df['Bin']]
+    calibration_df['BinEnd'] = CALIBRATION_BINS[calibration_df['Bin'] + 1]
+    return calibration_df[['BinStart', 'BinEnd', 'Predicted', 'Observed', 'Count']]
+
+
+# Replay the last 'nb_editions' editions of the history, in parallel across editions
+def run_backtest(games_df, model=MODELS[0], kernel=DEFAULT_KERNEL, decay=DEFAULT_DECAY, nb_editions=10, workers=1):
+    games_df = parse_dates(games_df[['Date', 'HomeTeam', 'AwayTeam', 'HomeTeamGoal', 'AwayTeamGoal']].copy())
+    games_df = games_df.dropna(subset=['HomeTeamGoal', 'AwayTeamGoal'])
+
+    # The first edition has no history to be fitted on
+    editions = np.sort(games_df['Date'].dt.year.unique())[1:][-nb_editions:]
+    arguments = (editions, repeat(games_df), repeat(model), repeat(kernel), repeat(decay))
+
+    start = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(backtest_edition, *arguments))
+    else:
+        results = list(map(backtest_edition, *arguments))
+    wall_seconds = time.perf_counter() - start
+
+    editions_df = pd.DataFrame([metrics for metrics, _, _ in results])
+    probabilities = np.concatenate([probabilities for _, probabilities, _ in results])
+    observed = np.concatenate([observed for _, _, observed in results])
+
+    with np.errstate(divide='ignore'):
+        log_losses = -np.log(np.sum(probabilities * observed, axis=1))
+    summary = {
+        'Model': model,
+        'Kernel': kernel,
+        'Decay': float(decay),
+        'Editions': int(len(editions)),
+        'PredictedGames': int(len(probabilities)),
+        'LogLoss': float(log_losses.mean()),
+        'Brier': float(np.sum((probabilities - observed) ** 2, axis=1).mean()),
+        'FitSeconds': float(editions_df['FitSeconds'].sum()),
+        'PredictSeconds': float(editions_df['PredictSeconds'].sum()),
+        'WallSeconds': wall_seconds
+    }
+    return {
+        'Summary': summary,
+        'Editions': editions_df.to_dict(orient='records'),
+        'Calibration': get_calibration_table(probabilities, observed).to_dict(orient='records')
+    }
+
+
+# Differences of the summary metrics against a previous report
+def compare_reports(report, baseline_report):
+    metrics = ['LogLoss', 'Brier', 'FitSeconds', 'PredictSeconds', 'WallSeconds']
+    return pd.DataFrame({
+        'Baseline': [baseline_report['Summary'][metric] for metric in metrics],
+        'Current': [report['Summary'][metric] for metric in metrics]
+    }, index=metrics).assign(Difference=lambda df: df['Current'] - df['Baseline'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay past editions to measure prediction accuracy and speed.')
+    parser.add_argument('--past-games', help='CSV or parquet file of past games, the PastGames table by default')
+    parser.add_argument('--model', choices=MODELS, default=MODELS[0])
+    parser.add_argument('--kernel', choices=list(KERNELS), default=DEFAULT_KERNEL)
+    parser.add_argument('--decay', type=float, default=DEFAULT_DECAY)
+    parser.add_argument('--editions', type=int, default=10, help='number of most recent editions to replay')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--output', help='path of the JSON report')
+    parser.add_argument('--baseline', help='JSON report of a previous run to compare with')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger('__backtest__')
+
+    if args.past_games is None:
+        past_games_df = storage.read_table('PastGames')
+    elif args.past_games.endswith('.parquet'):
+        past_games_df = pd.read_parquet(args.past_games, engine='pyarrow')
+    else:
+        past_games_df = pd.read_csv(args.past_games)
+    report = run_backtest(past_games_df, args.model, args.kernel, args.decay, args.editions, args.workers)
+
+    logger.info(pd.DataFrame(report['Editions']).to_string(index=False))
+    logger.info(pd.DataFrame(report['Calibration']).to_string(index=False))
+    logger.info(json.dumps(report['Summary'], indent=2))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            logger.info(compare_reports(report, json.load(file)).to_string())
+
+
+if __name__ == "__main__":
+    main()
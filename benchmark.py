@@ -0,0 +1,160 @@
+import pandas as pd
+import polars as pl
+import numpy as np
+import argparse
+import platform
+import json
+import os
+import logging
+import synthetic_data
+import storage
+from benchmark_poisson import time_function
+from DataExtractor import DataExtractor
+from poisson_implementation import get_match_probabilities, predict_fixtures, predict_goals
+from push_data_to_cloud import from_pandas_to_parquet
+from TeamStrengthIndex import TeamStrengthIndex
+from weighting import DEFAULT_DECAY, DEFAULT_KERNEL, KERNELS, add_weights
+
+
+# Methods of DataExtractor timed by the suite, with the arguments they are called with
+def get_data_extractor_calls(home_team, away_team):
+    return {
+        'get_kpis': (),
+        'get_number_of_player_per_top_league': (),
+        'get_ranking_per_nation': (),
+        'get_market_value_per_nation': (),
+        'get_market_value_per_position': (),
+        'get_average_age_cap': (),
+        'get_result_of_the_competiton': (),
+        'get_tournament_info': (),
+        'get_fixtures_info': (),
+        'get_fixtures_predictions': (home_team, away_team),
+        'past_games': (home_team, away_team),
+        'get_head_to_head_summary': (home_team, away_team)
+    }
+
+
+# Best time of the function over 'repeat' calls. A failing case is reported rather than stopping
+# the suite, so that reports of different versions can still be compared.
+def run_case(name, function, repeat):
+    try:
+        seconds, _ = time_function(function, repeat)
+        return {'Name': name, 'Seconds': seconds, 'Error': None}
+    except Exception as e:
+        return {'Name': name, 'Seconds': None, 'Error': f"{type(e).__name__}: {e}"}
+
+
+# Tables as served to the dashboard: encoded like push_data_to_cloud, read back like app.py
+def get_dashboard_tables(tables):
+    return {
+        name: pl.read_parquet(from_pandas_to_parquet(storage.to_export_frame(df)).getvalue())
+        for name, df in tables.items()
+    }
+
+
+def run_benchmark(tables, kernel=DEFAULT_KERNEL, decay=DEFAULT_DECAY, repeat=3):
+    results = []
+    reference_date = pd.Timestamp.now().normalize()
+    games_df = pd.concat([tables['PastGames'][['Date', 'HomeTeam', 'AwayTeam', 'HomeTeamGoal', 'AwayTeamGoal']], tables['Game']])
+    fixtures_df = tables['Fixture']
+
+    # Predictions
+    results.append(run_case('add_weights', lambda: add_weights(games_df.copy(), kernel, decay, reference_date), repeat))
+    team_strength_index = TeamStrengthIndex.from_games(add_weights(games_df.copy(), kernel, decay, reference_date))
+    results.append(run_case('TeamStrengthIndex.from_games', lambda: TeamStrengthIndex.from_games(add_weights(games_df.copy(), kernel, decay, reference_date)), repeat))
+
+    # One fixture at a time, as the notebook priced them
+    fixtures = list(zip(fixtures_df['HomeTeam'], fixtures_df['AwayTeam']))
+
+    def predict_all_goals():
+        return [
+            (home, away, predict_goals(home, away, 'Home', team_strength_index), predict_goals(away, home, 'Away', team_strength_index))
+            for home, away in fixtures
+        ]
+
+    results.append(run_case('predict_goals', predict_all_goals, repeat))
+    goals = predict_all_goals()
+    results.append(run_case('get_match_probabilities', lambda: [
+        get_match_probabilities(home, away, home_probs, away_probs) for home, away, home_probs, away_probs in goals
+    ], repeat))
+
+    results.append(run_case('predict_fixtures', lambda: predict_fixtures(fixtures_df, team_strength_index), repeat))
+    tables = {**tables, 'Outcome': predict_fixtures(fixtures_df, team_strength_index)}
+
+    # Parquet encode of every table pushed to the blob storage
+    for name, df in tables.items():
+        results.append(run_case(f"from_pandas_to_parquet[{name}]", lambda df=df: from_pandas_to_parquet(storage.to_export_frame(df)), repeat))
+
+    # Dashboard
+    dashboard_tables = get_dashboard_tables(tables)
+    data_extractor = DataExtractor(
+        dashboard_tables['Player'], dashboard_tables['Nation'], dashboard_tables['Club'], dashboard_tables['Fixture'],
+        dashboard_tables['Outcome'], dashboard_tables['Game'], dashboard_tables['PastGames']
+    )
+    for method, arguments in get_data_extractor_calls(*fixtures[0]).items():
+        results.append(run_case(f"DataExtractor.{method}", lambda method=method, arguments=arguments: getattr(data_extractor, method)(*arguments), repeat))
+
+    return results
+
+
+def get_report(results, settings):
+    return {
+        'Settings': settings,
+        'Environment': {
+            'Python': platform.python_version(),
+            'Pandas': pd.__version__,
+            'Polars': pl.__version__,
+            'NumPy': np.__version__,
+            'CPUs': os.cpu_count()
+        },
+        'Timings': results
+    }
+
+
+# Times of the current report against a previous one, a ratio above 1 means slower
+def compare_reports(report, baseline_report):
+    current = pd.DataFrame(report['Timings']).set_index('Name')['Seconds']
+    baseline = pd.DataFrame(baseline_report['Timings']).set_index('Name')['Seconds']
+    comparison_df = pd.DataFrame({'Baseline': baseline, 'Current': current})
+    return comparison_df.assign(Ratio=lambda df: df['Current'] / df['Baseline'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the predictions, the upload encoding and the dashboard on synthetic tables.')
+    parser.add_argument('--nations', type=int, default=200)
+    parser.add_argument('--players', type=int, default=100_000)
+    parser.add_argument('--clubs', type=int, default=5_000)
+    parser.add_argument('--past-games', type=int, default=1_000_000)
+    parser.add_argument('--fixture-teams', type=int, default=24)
+    parser.add_argument('--kernel', choices=list(KERNELS), default=DEFAULT_KERNEL)
+    parser.add_argument('--decay', type=float, default=DEFAULT_DECAY)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='path of the JSON report')
+    parser.add_argument('--baseline', help='JSON report of a previous run to compare with')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger('__benchmark__')
+
+    settings = {
+        'Nations': args.nations, 'Players': args.players, 'Clubs': args.clubs, 'PastGames': args.past_games,
+        'FixtureTeams': args.fixture_teams, 'Kernel': args.kernel, 'Decay': args.decay, 'Repeat': args.repeat, 'Seed': args.seed
+    }
+    tables = synthetic_data.generate_tables(args.nations, args.players, args.clubs, args.past_games, args.fixture_teams, args.seed)
+    logger.info("Synthetic tables generated: " + ", ".join(f"{name} {len(df)} rows" for name, df in tables.items()))
+
+    report = get_report(run_benchmark(tables, args.kernel, args.decay, args.repeat), settings)
+    logger.info(pd.DataFrame(report['Timings']).to_string(index=False))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            logger.info(compare_reports(report, json.load(file)).to_string())
+
+
+if __name__ == "__main__":
+    main()
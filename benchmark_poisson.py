@@ -0,0 +1,81 @@
+import pandas as pd
+import numpy as np
+import argparse
+import json
+import time
+import logging
+import poisson_polars
+import synthetic_data
+from poisson_implementation import predict_fixtures
+from TeamStrengthIndex import TeamStrengthIndex
+from weighting import DEFAULT_DECAY, DEFAULT_KERNEL, KERNELS, add_weights
+
+
+# Best wall time of 'repeat' calls, and the result of the last call
+def time_function(function, repeat=3):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        seconds.append(time.perf_counter() - start)
+    return min(seconds), result
+
+
+# Outcome probabilities of the same fixtures with the pandas and the polars implementations, from
+# the raw games to the outcomes. Each one starts from its own frame, as in the pipeline where the
+# polars predictions scan the match history; the pandas to polars conversion is timed apart.
+def run_benchmark(games_df, fixtures_df, kernel=DEFAULT_KERNEL, decay=DEFAULT_DECAY, repeat=3):
+    reference_date = pd.Timestamp.now().normalize()
+    conversion_seconds, games_lf = time_function(lambda: poisson_polars.to_lazy(games_df).collect().lazy(), 1)
+
+    def predict_pandas():
+        team_strength_index = TeamStrengthIndex.from_games(add_weights(games_df.copy(), kernel, decay, reference_date))
+        return predict_fixtures(fixtures_df, team_strength_index)
+
+    def predict_polars():
+        return poisson_polars.predict_fixtures(fixtures_df, games_lf, kernel, decay, reference_date=reference_date)
+
+    pandas_seconds, pandas_df = time_function(predict_pandas, repeat)
+    polars_seconds, polars_df = time_function(predict_polars, repeat)
+
+    columns = pandas_df.columns[2:]
+    return {
+        'Games': int(len(games_df)),
+        'Fixtures': int(len(fixtures_df)),
+        'Kernel': kernel,
+        'Decay': float(decay),
+        'PandasSeconds': pandas_seconds,
+        'PolarsSeconds': polars_seconds,
+        'ConversionSeconds': conversion_seconds,
+        'Speedup': pandas_seconds / polars_seconds,
+        'MaxDifference': float(np.nanmax(np.abs(pandas_df[columns].to_numpy(float) - polars_df[columns].to_numpy(float))))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the pandas and polars Poisson predictions on a synthetic history.')
+    parser.add_argument('--games', type=int, default=1_000_000)
+    parser.add_argument('--teams', type=int, default=200)
+    parser.add_argument('--fixture-teams', type=int, default=24, help='teams of the round robin priced')
+    parser.add_argument('--kernel', choices=list(KERNELS), default=DEFAULT_KERNEL)
+    parser.add_argument('--decay', type=float, default=DEFAULT_DECAY)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='path of the JSON report')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger('__benchmark__')
+
+    games_df = synthetic_data.generate_games(args.games, args.teams, seed=args.seed)
+    fixtures_df = synthetic_data.generate_fixtures(args.fixture_teams)
+    report = run_benchmark(games_df, fixtures_df, args.kernel, args.decay, args.repeat)
+    logger.info(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
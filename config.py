@@ -27,3 +27,24 @@ TRANSFERTMARKT_TEAMS_ID = {
 }
 
 PLAYER_FILE_NAME = 'player.csv'
+
+# 'threads' fetches pages with a thread pool, 'async' with a single event loop (requires aiohttp)
+SCRAPING_BACKEND = 'threads'
+
+# Groups of the 2024 edition, with team names as they appear in the Game and Fixture tables
+GROUPS = {
+    'A': ['Equatorial Guinea', 'Nigeria', 'Ivory Coast', 'Guinea-Bissau'],
+    'B': ['Cape Verde', 'Egypt', 'Ghana', 'Mozambique'],
+    'C': ['Senegal', 'Cameroon', 'Guinea', 'Gambia'],
+    'D': ['Angola', 'Burkina Faso', 'Mauritania', 'Algeria'],
+    'E': ['Mali', 'South Africa', 'Namibia', 'Tunisie'],
+    'F': ['Maroc', 'Congo', 'Zambia', 'Tanzania']
+}
+
+# Round of 16 in bracket order: the winners of two consecutive ties meet in the next round.
+# '1A' is the winner of group A, '2A' the runner-up and '3BEF' one of the four best
+# third-placed teams, coming from group B, E or F.
+ROUND_OF_16 = [
+    ('2A', '2C'), ('1D', '3BEF'), ('1B', '3ACD'), ('1F', '2E'),
+    ('1A', '3CDE'), ('2B', '2F'), ('1C', '3ABF'), ('1E', '2D')
+]
@@ -0,0 +1,53 @@
+import pytest
+from PageFetcher import FileTransport, TransportResponse
+
+
+# Transport recording the headers of every request, around another transport
+class RecordingTransport:
+    def __init__(self, transport):
+        self._transport = transport
+        self.requests = []
+
+    def get(self, url, headers, timeout):
+        self.requests.append(dict(headers))
+        return self._transport.get(url, headers, timeout)
+
+    def close(self):
+        pass
+
+
+# Server answering with lower-case header names and honouring If-None-Match
+class LowerCaseTransport:
+    def __init__(self, content):
+        self._content = content
+
+    def get(self, url, headers, timeout):
+        if headers.get('If-None-Match') == '"v1"':
+            return TransportResponse(304, {}, b'')
+        return TransportResponse(200, {'etag': '"v1"', 'last-modified': 'Mon, 01 Jan 2024 00:00:00 GMT'}, self._content)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def url():
+    return 'https://www.example.com/page'
+
+
+@pytest.fixture
+def page(tmp_path):
+    path = tmp_path / 'page.html'
+    path.write_bytes(b'<html>page</html>')
+    return str(path)
+
+
+# Saved page served at 'url', with the headers of every request recorded
+@pytest.fixture
+def file_transport(url, page):
+    return RecordingTransport(FileTransport({url: page}))
+
+
+@pytest.fixture
+def lower_case_transport():
+    return RecordingTransport(LowerCaseTransport(b'<html>page</html>'))
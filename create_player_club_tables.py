@@ -0,0 +1,337 @@
+import pandas as pd
+import numpy as np
+from bs4 import BeautifulSoup, SoupStrainer
+import json
+import re
+import os
+import logging
+import config
+import storage
+from PageFetcher import PageFetcher
+from PlayerProfileCache import PlayerProfileCache
+
+
+CACHE_DIR = storage.get_dataset_path('http_cache')
+PICTURES_FOLDER = "team_pictures"
+
+# Squads already scraped by an interrupted run, so that the next run only fetches what is missing
+PROGRESS_FILE = storage.get_dataset_path('TransfermarktProgress.json')
+
+# Caps and goals of every player, only profiles gone stale are fetched again
+PROFILE_CACHE_FILE = storage.get_dataset_path('PlayerProfile.sqlite')
+
+# Hand-made list of the best clubs and top leagues
+BEST_CLUB_FILE = storage.get_dataset_path('Club.csv')
+
+SQUAD_URL = "https://www.transfermarkt.fr/elfenbeinkuste/kader/verein/{team_id}/saison_id/2023"
+PROFILE_URL = "https://www.transfermarkt.fr/player-name/profil/spieler/{player_id}"
+
+# Transfermarkt blocks aggressive clients: a few workers sharing a global request rate
+MAX_WORKERS = 8
+MAX_CONCURRENCY = 50
+REQUESTS_PER_SECOND = 5
+
+# Pages fetched by an interrupted run are reused by the next one, staleness of profiles is
+# decided by the profile cache
+PAGE_TTL = 3600
+
+# Only the caps/goals links of a profile page are kept in the BeautifulSoup tree
+CAPS_GOALS_STRAINER = SoupStrainer('a', class_=re.compile('data-header__content--highlight'))
+
+PLAYER_COLUMNS = ['PlayerID', 'ShirtNumber', 'PlayerName', 'Age',
+                  'Nationality', 'NationRanking', 'NationID',
+                  'Position', 'Club', 'MarketValue']
+
+
+def get_flag_url(pageSoup):
+    image_tag = pageSoup.find('img', class_='flaggenrahmen')
+    return image_tag['src'] if image_tag else None
+
+
+def extract_players_information(pageSoup, nationality, ranking_nation, team_id):
+    # Initialize an empty list to store player information
+    players_info = []
+
+    # Iterate through each player entry in the HTML
+    for row in pageSoup.find_all('tr', {'class': ['even', 'odd']}):
+        # Extracting each piece of information
+        shirt_number = row.find('div', class_='rn_nummer').text.strip()
+        player_link = row.find('a', href=re.compile(r'/profil/spieler/'))
+        player_id = re.search(r'/profil/spieler/(\d+)', player_link['href']).group(1)
+        player_name = player_link.text.strip()
+        position = row.find_all('td')[4].text.strip()  # Adjust index based on HTML structure
+        club = row.find('a', href=re.compile(r'/startseite/verein/'))['title']
+        age_td = row.find_all('td', class_='zentriert')
+        age = age_td[1].text.strip() if len(age_td) > 1 else None  # Adjust index based on HTML structure
+        market_value_tag = row.find('td', class_='rechts hauptlink')
+        market_value = market_value_tag.text.strip() if market_value_tag else None
+
+        players_info.append({
+            'PlayerID': player_id,
+            'ShirtNumber': shirt_number,
+            'PlayerName': player_name,
+            'Age': age,
+            'Nationality': nationality,
+            'NationRanking': ranking_nation,
+            'NationID': team_id,
+            'Position': position,
+            'Club': club,
+            'MarketValue': market_value
+        })
+
+    return players_info
+
+
+def extract_ranking_nation(pageSoup):
+    # Find the <a> tag and extract the text
+    a_tag = pageSoup.find('a', href="/statistik/weltrangliste")
+    if a_tag:
+        ranking_text = a_tag.text.strip()
+        # Extract the nation classement part
+        return ranking_text.split(' ')[-1]
+    return None
+
+
+# Players, nation ranking and flag url of a squad page
+def parse_squad(page_content, team_name, team_id):
+    pageSoup = BeautifulSoup(page_content, 'html.parser')
+    ranking_nation = extract_ranking_nation(pageSoup)
+    return {
+        'Players': extract_players_information(pageSoup, team_name, ranking_nation, team_id),
+        'FlagUrl': get_flag_url(pageSoup)
+    }
+
+
+# Caps and goals of a profile page, None when the player has no international record
+def parse_caps_goals(page_content):
+    pageSoup = BeautifulSoup(page_content, 'html.parser', parse_only=CAPS_GOALS_STRAINER)
+    numbers = [a.text.strip() for a in pageSoup.find_all('a', class_='data-header__content--highlight')]
+    try:
+        caps, goals = (None, None) if len(numbers) < 2 else map(int, numbers[:2])
+    except ValueError:
+        caps, goals = None, None
+    return {'Cap': caps, 'Goal': goals}
+
+
+# Function to convert market value string to integer
+def convert_market_value(value):
+    if pd.isna(value):
+        return np.nan  # or return 0 if you want to treat NaN as 0
+    value = value.replace('€', '').strip()
+    value = value.replace(',', '.')
+    if 'mio.' in value:
+        return float(value.replace('mio.', '')) * 1000000
+    elif 'K' in value:
+        return float(value.replace('K', '')) * 1000
+    return float(value)
+
+
+# Function to replace the entire value based on keywords
+def replace_position(value):
+    if 'Défenseur' in value or 'Arrière' in value:
+        return 'Defense'
+    elif 'Milieu' in value:
+        return 'Midfield'
+    elif 'Attaquant' in value or 'Ailier' in value or 'Avant-centre' in value or 'Deuxième' in value:
+        return 'Offense'
+    elif 'Gardien' in value:
+        return 'Keeper'
+    else:
+        return value
+
+
+def load_progress(path=PROGRESS_FILE):
+    if not os.path.exists(path):
+        return {'Squads': {}}
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_progress(progress, path=PROGRESS_FILE):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(progress, file)
+
+
+# Squad pages of the teams not in the progress yet, fetched through the shared worker pool.
+# Returns the names of the teams that could not be scraped.
+def scrap_squads(fetcher, teams, progress, logger):
+    missing_teams = [(team_name, team_id) for team_name, team_id in teams.items() if team_name not in progress['Squads']]
+    urls = [SQUAD_URL.format(team_id=team_id) for _, team_id in missing_teams]
+
+    failed_teams = []
+    for (team_name, team_id), result in zip(missing_teams, fetcher.fetch_many(urls, return_exceptions=True)):
+        if isinstance(result, Exception):
+            logger.error(f"Error while fetching team {team_name}: {result}")
+            failed_teams.append(team_name)
+            continue
+        try:
+            progress['Squads'][team_name] = parse_squad(result.content, team_name, team_id)
+        except (AttributeError, IndexError, KeyError, TypeError, ValueError) as e:
+            logger.error(f"Error while parsing team {team_name}: {e}")
+            failed_teams.append(team_name)
+    return failed_teams
+
+
+# Profile pages of the players gone stale in the cache. Pages answered unchanged, or with the
+# ETag already cached, are not parsed again. Returns the ids that could not be fetched.
+def scrap_caps_goals(fetcher, players_df, profile_cache, games_df, logger):
+    stale_ids = profile_cache.get_stale_players(players_df, games_df)
+    cached_etags = profile_cache.get_etags(stale_ids)
+    urls = [PROFILE_URL.format(player_id=player_id) for player_id in stale_ids]
+    logger.info(f"{len(stale_ids)} of {len(players_df)} profiles to refresh")
+
+    failed_ids, unchanged_ids, changed_rows = [], [], []
+    for player_id, result in zip(stale_ids, fetcher.fetch_many(urls, return_exceptions=True)):
+        if isinstance(result, Exception):
+            logger.error(f"Error while fetching player {player_id}: {result}")
+            failed_ids.append(player_id)
+        elif player_id in cached_etags and (not result.modified or (result.etag and result.etag == cached_etags[player_id])):
+            unchanged_ids.append(player_id)
+        else:
+            caps_goals = parse_caps_goals(result.content)
+            changed_rows.append((player_id, caps_goals['Cap'], caps_goals['Goal'], result.etag))
+
+    profile_cache.update_profiles(changed_rows)
+    profile_cache.touch_profiles(unchanged_ids)
+    return failed_ids
+
+
+# Flags not saved yet are downloaded concurrently into the pictures folder
+def download_team_pictures(fetcher, flag_urls, folder_path=PICTURES_FOLDER):
+    os.makedirs(folder_path, exist_ok=True)
+    missing_flags = {team_name: url for team_name, url in flag_urls.items()
+                     if url and not os.path.exists(os.path.join(folder_path, f"{team_name}.png"))}
+
+    failed_teams = []
+    for team_name, result in zip(missing_flags, fetcher.fetch_many(list(missing_flags.values()), return_exceptions=True)):
+        if isinstance(result, Exception):
+            failed_teams.append(team_name)
+            continue
+        with open(os.path.join(folder_path, f"{team_name}.png"), 'wb') as file:
+            file.write(result.content)
+    return failed_teams
+
+
+def get_squad_players(progress):
+    players_info = [player for squad in progress['Squads'].values() for player in squad['Players']]
+    return pd.DataFrame(players_info, columns=PLAYER_COLUMNS)
+
+
+def create_tables(players_df, profiles_df, best_club_df):
+    players_df = players_df.merge(profiles_df[['PlayerID', 'Cap', 'Goal']], on='PlayerID', how='left')
+
+    # Transform market Value column processing
+    players_df['MarketValue'] = players_df['MarketValue'].apply(convert_market_value)
+    players_df['Age'] = pd.to_numeric(players_df['Age'], errors='coerce').fillna(0).astype(int)
+    players_df['MarketValue'] = pd.to_numeric(players_df['MarketValue'], errors='coerce').fillna(0).astype(float)
+    players_df['Cap'] = pd.to_numeric(players_df['Cap'], errors='coerce').fillna(0).astype(int)
+    players_df['Goal'] = pd.to_numeric(players_df['Goal'], errors='coerce').fillna(0).astype(int)
+    # Ids are scraped as text, the next stages get them as integers like from the CSV
+    players_df['PlayerID'] = players_df['PlayerID'].astype(int)
+    players_df['NationID'] = players_df['NationID'].astype(int)
+    players_df['NationRanking'] = pd.to_numeric(players_df['NationRanking'], errors='coerce')
+
+    players_df['Position'] = players_df['Position'].apply(replace_position)
+
+    club_players_df = pd.DataFrame(players_df['Club'].unique(), columns=['Club'])
+    club_players_df['ClubID'] = np.arange(0, len(club_players_df))
+
+    clubs_df = club_players_df.merge(best_club_df, on='Club', how='left')
+    clubs_df.sort_values(by=['BestClub'], inplace=True, ascending=False)
+
+    # Fill NaN values in specific columns with desired values
+    clubs_df['TopLeague'] = clubs_df['TopLeague'].fillna(False)
+    clubs_df['BestClub'] = clubs_df['BestClub'].fillna(False)
+    clubs_df['Country'] = clubs_df['Country'].fillna('No')
+
+    # Grouping and calculating the required aggregates
+    nation_df = players_df.groupby(['NationID', 'Nationality']).agg(
+        TotalPlayers=pd.NamedAgg(column='PlayerID', aggfunc='count'),
+        SumMarketValue=pd.NamedAgg(column='MarketValue', aggfunc='sum'),
+        MedianMarketValue=pd.NamedAgg(column='MarketValue', aggfunc='median'),
+        AverageMarketValue=pd.NamedAgg(column='MarketValue', aggfunc='mean'),
+        AgeAverage=pd.NamedAgg(column='Age', aggfunc='mean'),
+        AverageCap=pd.NamedAgg(column='Cap', aggfunc='mean'),
+        NationRanking=pd.NamedAgg(column='NationRanking', aggfunc='first')  # Ranking is the same for all players from a nation
+    ).reset_index()
+
+    # Find the most common position for each nation
+    common_position = players_df.groupby(['NationID', 'Position']).size().reset_index(name='Count').sort_values(['NationID', 'Count'], ascending=[True, False])
+    common_position = common_position.drop_duplicates(subset=['NationID']).set_index('NationID')['Position']
+
+    nation_df = nation_df.set_index('NationID')
+    nation_df['CommonPosition'] = nation_df.index.map(common_position)
+    nation_df = nation_df.reset_index()
+
+    players_df = players_df.merge(clubs_df, on='Club', how='left')
+    players_df.drop(['Club', 'Country', 'BestClub', 'TopLeague', 'Nationality', 'NationRanking'], axis=1, inplace=True)
+
+    return players_df, clubs_df, nation_df
+
+
+def create_fetcher(backend=config.SCRAPING_BACKEND):
+    if backend == 'async':
+        from AsyncPageFetcher import AsyncPageFetcher
+        return AsyncPageFetcher(cache_dir=CACHE_DIR, ttl=PAGE_TTL, max_concurrency=MAX_CONCURRENCY,
+                                rate_limit=REQUESTS_PER_SECOND)
+    return PageFetcher(cache_dir=CACHE_DIR, ttl=PAGE_TTL, max_workers=MAX_WORKERS, rate_limit=REQUESTS_PER_SECOND)
+
+
+# Returns the Player, Club and Nation tables, or no table when the previous ones are kept
+def main(fetcher=None, download_flags=True, backend=config.SCRAPING_BACKEND, tables=None):
+
+    logging.info('Extract Players, Clubs and Nations.')
+    logger = logging.getLogger('__Transfermarkt__')
+    logger.setLevel(logging.INFO)
+
+    # A fetcher created by the stage is closed once the pages are scraped, a given one is left to the caller
+    own_fetcher = fetcher is None
+    fetcher = create_fetcher(backend) if own_fetcher else fetcher
+    try:
+        progress = load_progress(PROGRESS_FILE)
+
+        # An interrupted run resumes with the squads it already scraped
+        failed_teams = scrap_squads(fetcher, config.TRANSFERTMARKT_TEAMS_ID, progress, logger)
+        save_progress(progress, PROGRESS_FILE)
+        if failed_teams:
+            logger.error(f"{len(failed_teams)} squads missing, tables are not updated: {failed_teams}")
+            return {}
+        logger.info("Squads scraped !")
+
+        # Caps and goals only change when a nation plays, other profiles are served by the cache
+        players_df = get_squad_players(progress)
+        if tables is not None and 'Game' in tables:
+            games_df = tables['Game']
+        elif storage.table_exists('Game') or storage.table_exists('Game', 'csv'):
+            games_df = storage.read_table('Game')
+        else:
+            games_df = pd.DataFrame(columns=['Date', 'HomeTeam', 'AwayTeam'])
+        profile_cache = PlayerProfileCache(PROFILE_CACHE_FILE)
+        failed_ids = scrap_caps_goals(fetcher, players_df, profile_cache, games_df, logger)
+        profiles_df = profile_cache.get_profiles()
+        profile_cache.close()
+        logger.info(f"Caps and goals scraped, {len(failed_ids)} profiles missing")
+
+        if download_flags:
+            flag_urls = {team_name: squad['FlagUrl'] for team_name, squad in progress['Squads'].items()}
+            failed_flags = download_team_pictures(fetcher, flag_urls, PICTURES_FOLDER)
+            if failed_flags:
+                logger.error(f"Flags not downloaded: {failed_flags}")
+    finally:
+        if own_fetcher:
+            fetcher.close()
+
+    best_club_df = pd.read_csv(BEST_CLUB_FILE, encoding='ISO-8859-1')
+    players_df, clubs_df, nation_df = create_tables(players_df, profiles_df, best_club_df)
+
+    players_df = storage.write_table(players_df, 'Player')
+    clubs_df = storage.write_table(clubs_df, 'Club')
+    nation_df = storage.write_table(nation_df, 'Nation')
+    logger.info("Player, Club and Nation tables saved in local computer !")
+
+    # Missing profiles have no fetch time and are retried by the next run, squads are scraped again
+    os.remove(PROGRESS_FILE)
+    return {'Player': players_df, 'Club': clubs_df, 'Nation': nation_df}
+
+if __name__ == "__main__":
+    main()
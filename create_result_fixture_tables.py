@@ -1,9 +1,31 @@
 import pandas as pd
-from bs4 import BeautifulSoup
 from datetime import datetime
 import requests
 import re
 import logging
+import config
+import storage
+from PageFetcher import PageFetcher
+
+
+CACHE_DIR = storage.get_dataset_path('http_cache')
+
+FIXTURES_URL = "https://www.skysports.com/africa-cup-of-nations-fixtures"
+RESULTS_URL = "https://www.skysports.com/africa-cup-of-nations-results"
+
+# lxml walks the page much faster than BeautifulSoup, which is only used when lxml is not installed
+try:
+    import lxml.html
+    from lxml.etree import XPath
+
+    def _class_xpath(class_name):
+        return XPath(f".//span[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')]")
+
+    HOME_TEAM_XPATH = _class_xpath('matches__participant--side1')
+    AWAY_TEAM_XPATH = _class_xpath('matches__participant--side2')
+    SCORE_XPATH = _class_xpath('matches__teamscores-side')
+except ImportError:
+    lxml = None
 
 
 # Improved function
@@ -21,30 +43,88 @@ def convert_date(date_str, default_year="2024"):
     return date_obj.strftime('%d/%m/%Y')
 
 
-def fetch_page(url):
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/88.0.4324.150 Safari/537.36'
-    }
-    with requests.Session() as session:
-        response = session.get(url, headers=headers)
-        response.raise_for_status()
-        return response.content
+def create_fetcher(backend=config.SCRAPING_BACKEND):
+    if backend == 'async':
+        from AsyncPageFetcher import AsyncPageFetcher
+        return AsyncPageFetcher(cache_dir=CACHE_DIR)
+    return PageFetcher(cache_dir=CACHE_DIR)
+
+
+# A fetcher created here is closed once the page is fetched, a given one is left to the caller
+def fetch_page(url, fetcher=None):
+    if fetcher is not None:
+        return fetcher.fetch(url).content
+    fetcher = PageFetcher()
+    try:
+        return fetcher.fetch(url).content
+    finally:
+        fetcher.close()
+
+
+# Date header text of each match block, with its home team, away team and score tags
+def _iter_matches_lxml(page_content):
+    date = None
+    for element in lxml.html.fromstring(page_content).iter('h4', 'div'):
+        classes = (element.get('class') or '').split()
+        if 'fixres__header2' in classes:
+            date = element.text_content()
+        elif 'fixres__item' in classes:
+            home_teams = HOME_TEAM_XPATH(element)
+            away_teams = AWAY_TEAM_XPATH(element)
+            yield (date, home_teams[0] if home_teams else None, away_teams[0] if away_teams else None,
+                   SCORE_XPATH(element))
+
+
+def _iter_matches_soup(page_content):
+    # Imported here, BeautifulSoup is only needed when lxml is not installed
+    from bs4 import BeautifulSoup, SoupStrainer
+
+    # Only the date headers and the match blocks are kept in the BeautifulSoup tree
+    strainer = SoupStrainer(['h4', 'div'], class_=['fixres__header2', 'fixres__item'])
+    date = None
+    soup = BeautifulSoup(page_content, 'html.parser', parse_only=strainer)
+    for element in soup.find_all(['h4', 'div'], class_=['fixres__header2', 'fixres__item']):
+        if 'fixres__header2' in element.get('class', []):
+            date = element.text
+        else:
+            yield (date, element.find('span', class_='matches__participant--side1'),
+                   element.find('span', class_='matches__participant--side2'),
+                   element.find_all('span', class_='matches__teamscores-side'))
+
+
+def _get_text(tag):
+    return (tag.text_content() if lxml is not None else tag.text).strip()
+
+
+# Walks the date headers and match blocks once in document order, each match takes the date of
+# the last header seen. With scores, only matches showing both scores are kept.
+def parse_matches(page_content, with_scores=False):
+    iter_matches = _iter_matches_lxml if lxml is not None else _iter_matches_soup
+    matches_info = []
+    for date, home_team, away_team, score_tags in iter_matches(page_content):
+        if date is None or home_team is None or away_team is None:
+            continue
+        if with_scores and len(score_tags) != 2:
+            continue
+
+        match_info = {
+            'Date': date.strip(),
+            'HomeTeam': _get_text(home_team),
+            'AwayTeam': _get_text(away_team)
+        }
+        if with_scores:
+            match_info['HomeTeamGoal'] = _get_text(score_tags[0])
+            match_info['AwayTeamGoal'] = _get_text(score_tags[1])
+        matches_info.append(match_info)
+    return matches_info
 
 
 def parse_fixtures(page_content):
-    soup = BeautifulSoup(page_content, 'html.parser')
-    fixtures_info = []
-    for fixture in soup.find_all('div', class_='fixres__item'):
-        date = fixture.find_previous_sibling('h4', class_='fixres__header2')
-        home_team = fixture.find('span', class_='matches__participant--side1')
-        away_team = fixture.find('span', class_='matches__participant--side2')
-        if date and home_team and away_team:
-            fixtures_info.append({
-                'Date': date.text.strip(),
-                'HomeTeam': home_team.text.strip(),
-                'AwayTeam': away_team.text.strip()
-            })
-    return fixtures_info
+    return parse_matches(page_content)
+
+
+def parse_results(page_content):
+    return parse_matches(page_content, with_scores=True)
 
 
 def replace_team_name(df, replacements):
@@ -54,24 +134,17 @@ def replace_team_name(df, replacements):
 
     return df
 
-def main():
+# Team names as they appear in the other tables
+TEAM_NAME_REPLACEMENTS = {
+    'Morocco': 'Maroc',
+    'Tunisia': 'Tunisie',
+    'DR Congo': 'Congo',
+    'Burkina': 'Burkina Faso'
+}
 
-    logging.info('Extract Fixtures and Played Games.')
-    logger = logging.getLogger('__CAN_2024_')
-    logger.setLevel(logging.INFO)
-
-    logger.info("Start scrapping fixtures")
 
-    # URL of the page to scrape
-    url = "https://www.skysports.com/africa-cup-of-nations-fixtures"
-
-    try:
-        page_content = fetch_page(url)
-        fixtures_info = parse_fixtures(page_content)
-    except requests.RequestException as e:
-        print(f"Error fetching page: {e}")
-    except Exception as e:
-        print(f"An error occurred: {e}")
+def build_fixture_table(page_content):
+    fixtures_info = parse_fixtures(page_content)
 
     # Create a DataFrame from the scraped data
     fixtures_info_df = pd.DataFrame(fixtures_info, columns=['Date', 'HomeTeam', 'AwayTeam'])
@@ -94,60 +167,18 @@ def main():
     # Join the words into a regular expression
     regex_pattern = '|'.join(words_to_filter)
 
-
     # Filter rows where 'HomeTeam' contains any of the words
     fixtures_info_df = fixtures_info_df[~fixtures_info_df['HomeTeam'].str.contains(regex_pattern, case=False, na=False)]
     fixtures_info_df = fixtures_info_df[~fixtures_info_df['AwayTeam'].str.contains(regex_pattern, case=False, na=False)]
 
     # process team names
-    replacements = {
-        'Morocco': 'Maroc',
-        'Tunisia': 'Tunisie',
-        'DR Congo': 'Congo',
-        'Burkina': 'Burkina Faso'
-    }
-    fixtures_info_df = replace_team_name(fixtures_info_df, replacements)
+    fixtures_info_df = replace_team_name(fixtures_info_df, TEAM_NAME_REPLACEMENTS)
     fixtures_info_df['Date'] = fixtures_info_df['Date'].dt.strftime('%d/%m/%Y')
+    return fixtures_info_df
 
-    logger.info("Fixtures Table created !")
-
-    logger.info("Start scrapping games played !")
 
-    url = "https://www.skysports.com/africa-cup-of-nations-results"
-    try:
-        page_content = fetch_page(url)
-    except requests.RequestException as e:
-        print(f"Error fetching page: {e}")
-    except Exception as e:
-        print(f"An error occurred: {e}")
-
-    # Parse the HTML
-    pageSoup = BeautifulSoup(page_content, 'html.parser')
-
-    # Initialize an empty list to store game information
-    games_info = []
-
-    # Iterate through each game in the HTML
-    for game in pageSoup.find_all('div', class_='fixres__item'):
-        date_tag = game.find_previous_sibling('h4', class_='fixres__header2')
-        team1_tag = game.find('span', class_='matches__participant--side1')
-        team2_tag = game.find('span', class_='matches__participant--side2')
-        score_tags = game.find_all('span', class_='matches__teamscores-side')
-
-        if date_tag and team1_tag and team2_tag and len(score_tags) == 2:
-            date = date_tag.text.strip()
-            team1 = team1_tag.text.strip()
-            team2 = team2_tag.text.strip()
-            goal1 = score_tags[0].text.strip()
-            goal2 = score_tags[1].text.strip()
-
-            games_info.append({
-                'Date': date,
-                'HomeTeam': team1,
-                'AwayTeam': team2,
-                'HomeTeamGoal': goal1,
-                'AwayTeamGoal': goal2
-            })
+def build_game_table(page_content):
+    games_info = parse_results(page_content)
 
     # Create a DataFrame from the scraped data
     games_info_df = pd.DataFrame(games_info, columns=['Date', 'HomeTeam', 'AwayTeam', 'HomeTeamGoal', 'AwayTeamGoal'])
@@ -159,18 +190,78 @@ def main():
     games_info_df['Date'] = pd.to_datetime(games_info_df['Date'], format='%d/%m/%Y')
 
     # process team names
-    replacements = {
-        'Morocco': 'Maroc',
-        'Tunisia': 'Tunisie',
-        'DR Congo': 'Congo',
-        'Burkina': 'Burkina Faso'
-    }
-    games_info_df = replace_team_name(games_info_df, replacements)
+    games_info_df = replace_team_name(games_info_df, TEAM_NAME_REPLACEMENTS)
     # Format the dates to 'YYYY/MM/DD' (this will convert them to strings)
     games_info_df['Date'] = games_info_df['Date'].dt.strftime('%d/%m/%Y')
+    # Scores are scraped as text, the next stages get them as integers like from the CSV
+    games_info_df[['HomeTeamGoal', 'AwayTeamGoal']] = games_info_df[['HomeTeamGoal', 'AwayTeamGoal']].astype(int)
+    return games_info_df
 
+
+# Scrape one page into one table, no table is returned when the previous one is kept. A fetcher
+# created by the stage is closed before it returns.
+def _scrape_table(url, build_table, table_name, fetcher, logger):
+    own_fetcher = fetcher is None
+    fetcher = create_fetcher() if own_fetcher else fetcher
+    try:
+        page = fetcher.fetch(url)
+    except requests.RequestException as e:
+        logger.error(f"Error fetching {url}, previous '{table_name}' table is kept: {e}")
+        return {}
+    finally:
+        if own_fetcher:
+            fetcher.close()
+
+    if not page.modified and storage.table_exists(table_name):
+        logger.info(f"{url} unchanged, previous '{table_name}' table is kept.")
+        return {}
+
+    table_df = storage.write_table(build_table(page.content), table_name)
+    logger.info(f"'{table_name}' table saved in local computer !")
+    return {table_name: table_df}
+
+
+# Pipeline stages, fixtures and results are independent and can be scraped in parallel
+def scrape_fixtures(fetcher=None, tables=None):
+    return _scrape_table(FIXTURES_URL, build_fixture_table, 'Fixture', fetcher, logging.getLogger('__CAN_2024_'))
+
+
+def scrape_results(fetcher=None, tables=None):
+    return _scrape_table(RESULTS_URL, build_game_table, 'Game', fetcher, logging.getLogger('__CAN_2024_'))
+
+
+# Returns the Fixture and Game tables, or no table when the previous ones are kept
+def main(fetcher=None, backend=config.SCRAPING_BACKEND):
+
+    logging.info('Extract Fixtures and Played Games.')
+    logger = logging.getLogger('__CAN_2024_')
+    logger.setLevel(logging.INFO)
+
+    # Both pages are fetched concurrently, unchanged pages are answered from the cache
+    own_fetcher = fetcher is None
+    fetcher = create_fetcher(backend) if own_fetcher else fetcher
+    try:
+        fixtures_page, results_page = fetcher.fetch_many([FIXTURES_URL, RESULTS_URL])
+    except requests.RequestException as e:
+        logger.error(f"Error fetching pages, previous tables are kept: {e}")
+        return {}
+    finally:
+        if own_fetcher:
+            fetcher.close()
+
+    if not fixtures_page.modified and not results_page.modified and storage.table_exists('Game') and storage.table_exists('Fixture'):
+        logger.info("Fixtures and results pages unchanged, previous tables are kept.")
+        return {}
+
+    logger.info("Start scrapping fixtures")
+    fixtures_info_df = build_fixture_table(fixtures_page.content)
+    logger.info("Fixtures Table created !")
+
+    logger.info("Start scrapping games played !")
+    games_info_df = build_game_table(results_page.content)
     logger.info("Games Played table created !")
 
-    games_info_df.to_csv("C:/Users/guygi/OneDrive/Bureau/concaf_analytics/datasets/clean/Game.csv", encoding='utf-8-sig', index=False)
-    fixtures_info_df.to_csv("C:/Users/guygi/OneDrive/Bureau/concaf_analytics/datasets/clean/Fixture.csv", encoding='utf-8-sig', index=False)
-    logger.info("Fixtures and Games Played table saved in local computer !")
\ No newline at end of file
+    games_info_df = storage.write_table(games_info_df, 'Game')
+    fixtures_info_df = storage.write_table(fixtures_info_df, 'Fixture')
+    logger.info("Fixtures and Games Played table saved in local computer !")
+    return {'Fixture': fixtures_info_df, 'Game': games_info_df}
@@ -0,0 +1,85 @@
+import pandas as pd
+import logging
+import storage
+from storage import load_table
+
+
+# Aggregates shown by the dashboard, computed once per run instead of on every page load. The
+# table is long: one row per value, grouped in sections read by DataExtractor.
+KPI = 'Kpi'
+PLAYERS_PER_LEAGUE = 'PlayersPerLeague'
+MARKET_VALUE_PER_POSITION = 'MarketValuePerPosition'
+TOURNAMENT = 'Tournament'
+
+# Leagues shown on the dashboard, by club country, in the order the names are replaced
+LEAGUE_NAMES = {'FR': 'Ligue 1', 'ESP': 'La Liga', 'GER': 'Bundesliga', 'IT': 'Serie A', 'ENG': 'Premier League'}
+EXCLUDED_COUNTRIES = ['No', 'POR', 'UKR']
+
+
+def get_section(section, values):
+    return pd.DataFrame({'Section': section, 'Name': list(values), 'Value': [float(value) for value in values.values()]})
+
+
+# Same numbers as DataExtractor.get_kpis
+def get_kpis(players_df, clubs_df, nations_df):
+    df = players_df.merge(clubs_df[['ClubID', 'BestClub', 'TopLeague']], on='ClubID', how='left')
+    return {
+        'BestClubPlayers': df['BestClub'].eq(True).sum(),
+        'TopLeaguePlayers': df['TopLeague'].eq(True).sum(),
+        'AverageAge': players_df['Age'].mean(),
+        'AverageNationMarketValue': nations_df['SumMarketValue'].mean()
+    }
+
+
+# Same numbers as DataExtractor.get_number_of_player_per_top_league
+def get_players_per_league(players_df, clubs_df):
+    df = players_df.merge(clubs_df[['ClubID', 'Country']], on='ClubID', how='left')
+    counts = df.groupby('Country', observed=True)['PlayerID'].count()
+    counts = counts[~counts.index.isin(EXCLUDED_COUNTRIES)]
+
+    leagues = counts.index.astype(str).to_series()
+    for country, league in LEAGUE_NAMES.items():
+        leagues = leagues.str.replace(country, league, n=1, regex=False)
+    return dict(zip(leagues, counts))
+
+
+# Same numbers as DataExtractor.get_market_value_per_position
+def get_market_value_per_position(players_df):
+    return players_df.groupby('Position', observed=True)['MarketValue'].mean().round(1).to_dict()
+
+
+# Same numbers as DataExtractor.get_tournament_info
+def get_tournament_info(games_df):
+    nb_games = len(games_df)
+    nb_goals = games_df['HomeTeamGoal'].sum() + games_df['AwayTeamGoal'].sum()
+    nb_draws = (games_df['HomeTeamGoal'] == games_df['AwayTeamGoal']).sum()
+    return {
+        'Games': nb_games,
+        'Goals': nb_goals,
+        'AverageGoals': nb_goals / nb_games if nb_games else float('nan'),
+        'Wins': nb_games - nb_draws,
+        'Draws': nb_draws
+    }
+
+
+def create_dashboard_aggregates(players_df, clubs_df, nations_df, games_df):
+    return pd.concat([
+        get_section(KPI, get_kpis(players_df, clubs_df, nations_df)),
+        get_section(PLAYERS_PER_LEAGUE, get_players_per_league(players_df, clubs_df)),
+        get_section(MARKET_VALUE_PER_POSITION, get_market_value_per_position(players_df)),
+        get_section(TOURNAMENT, get_tournament_info(games_df))
+    ], ignore_index=True)
+
+
+def main(tables=None):
+    logging.info('Dashboard Aggregates.')
+    logger = logging.getLogger('__dashboard_aggregates__')
+    logger.setLevel(logging.INFO)
+
+    aggregates_df = create_dashboard_aggregates(
+        load_table('Player', tables), load_table('Club', tables), load_table('Nation', tables), load_table('Game', tables)
+        )
+
+    aggregates_df = storage.write_table(aggregates_df, 'DashboardAggregates')
+    logger.info("Dashboard aggregates successfully saved in local computer!")
+    return {'DashboardAggregates': aggregates_df}
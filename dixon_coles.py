@@ -0,0 +1,150 @@
+import numpy as np
+from goal_distribution import MAX_GOALS, poisson_pmf
+
+
+# Small L2 penalty on attack/defence parameters, keeps teams with few games (or no goals) finite
+REGULARISATION = 0.01
+
+# Bounds of the low-score dependence parameter
+RHO_BOUNDS = (-0.3, 0.3)
+
+
+# Dixon-Coles correction of the 0-0, 0-1, 1-0 and 1-1 scorelines, with its derivatives with
+# respect to log(home rate), log(away rate) and rho
+def get_low_score_correction(home_goals, away_goals, home_rates, away_rates, rho):
+    tau = np.ones_like(home_rates)
+    d_log_home = np.zeros_like(home_rates)
+    d_log_away = np.zeros_like(home_rates)
+    d_rho = np.zeros_like(home_rates)
+
+    nil_nil = (home_goals == 0) & (away_goals == 0)
+    nil_one = (home_goals == 0) & (away_goals == 1)
+    one_nil = (home_goals == 1) & (away_goals == 0)
+    one_one = (home_goals == 1) & (away_goals == 1)
+
+    rates_product = home_rates * away_rates
+    tau[nil_nil] = 1 - rates_product[nil_nil] * rho
+    tau[nil_one] = 1 + home_rates[nil_one] * rho
+    tau[one_nil] = 1 + away_rates[one_nil] * rho
+    tau[one_one] = 1 - rho
+    tau = np.maximum(tau, 1e-10)
+
+    d_log_home[nil_nil] = -rates_product[nil_nil] * rho
+    d_log_away[nil_nil] = -rates_product[nil_nil] * rho
+    d_rho[nil_nil] = -rates_product[nil_nil]
+    d_log_home[nil_one] = home_rates[nil_one] * rho
+    d_rho[nil_one] = home_rates[nil_one]
+    d_log_away[one_nil] = away_rates[one_nil] * rho
+    d_rho[one_nil] = away_rates[one_nil]
+    d_rho[one_one] = -1
+
+    return tau, d_log_home / tau, d_log_away / tau, d_rho / tau
+
+
+# Parameters are packed as [attack (n_teams), defence (n_teams), home advantage, rho]
+def unpack_parameters(parameters, nb_teams):
+    return parameters[:nb_teams], parameters[nb_teams:2 * nb_teams], parameters[-2], parameters[-1]
+
+
+# Weighted negative log-likelihood of the games (constant terms dropped) and its gradient
+def negative_log_likelihood(parameters, home_ids, away_ids, home_goals, away_goals, weights, nb_teams):
+    attack, defence, home_advantage, rho = unpack_parameters(parameters, nb_teams)
+
+    log_home_rates = home_advantage + attack[home_ids] + defence[away_ids]
+    log_away_rates = attack[away_ids] + defence[home_ids]
+    home_rates = np.exp(log_home_rates)
+    away_rates = np.exp(log_away_rates)
+
+    tau, d_tau_home, d_tau_away, d_tau_rho = get_low_score_correction(home_goals, away_goals, home_rates, away_rates, rho)
+
+    log_likelihood = weights * (np.log(tau) + home_goals * log_home_rates - home_rates + away_goals * log_away_rates - away_rates)
+    gradient_home = weights * (home_goals - home_rates + d_tau_home)
+    gradient_away = weights * (away_goals - away_rates + d_tau_away)
+
+    gradient = np.empty_like(parameters)
+    gradient[:nb_teams] = np.bincount(home_ids, gradient_home, nb_teams) + np.bincount(away_ids, gradient_away, nb_teams)
+    gradient[nb_teams:2 * nb_teams] = np.bincount(away_ids, gradient_home, nb_teams) + np.bincount(home_ids, gradient_away, nb_teams)
+    gradient[-2] = gradient_home.sum()
+    gradient[-1] = (weights * d_tau_rho).sum()
+
+    # Normalised by the total weight, penalised towards zero team parameters
+    total_weight = weights.sum()
+    team_parameters = parameters[:2 * nb_teams]
+    value = -log_likelihood.sum() / total_weight + REGULARISATION * np.sum(team_parameters ** 2)
+    gradient = -gradient / total_weight
+    gradient[:2 * nb_teams] += 2 * REGULARISATION * team_parameters
+
+    return value, gradient
+
+
+# Fit attack/defence parameters of all teams, home advantage and rho by weighted maximum likelihood
+# on the output of add_weights. Parameters of a previous fit are used as starting point for the
+# teams they know. Returns the parameters and the number of iterations of the optimiser.
+def fit_dixon_coles(df, initial_parameters=None, max_iterations=500):
+    # Imported here so that pricing from saved parameters does not pay for scipy
+    from scipy.optimize import minimize
+
+    df = df.dropna(subset=['HomeTeamGoal', 'AwayTeamGoal'])
+    teams = sorted(set(df['HomeTeam']) | set(df['AwayTeam']))
+    team_ids = {team: i for i, team in enumerate(teams)}
+    nb_teams = len(teams)
+
+    parameters = np.zeros(2 * nb_teams + 2)
+    if initial_parameters is not None:
+        previous_ids = {team: i for i, team in enumerate(initial_parameters['Teams'])}
+        for team, i in team_ids.items():
+            if team in previous_ids:
+                parameters[i] = initial_parameters['Attack'][previous_ids[team]]
+                parameters[nb_teams + i] = initial_parameters['Defence'][previous_ids[team]]
+        parameters[-2] = initial_parameters['HomeAdvantage']
+        parameters[-1] = initial_parameters['Rho']
+
+    arguments = (
+        df['HomeTeam'].map(team_ids).to_numpy(),
+        df['AwayTeam'].map(team_ids).to_numpy(),
+        df['HomeTeamGoal'].to_numpy(dtype=float),
+        df['AwayTeamGoal'].to_numpy(dtype=float),
+        df['Weight'].to_numpy(dtype=float),
+        nb_teams
+    )
+    bounds = [(None, None)] * (2 * nb_teams + 1) + [RHO_BOUNDS]
+    result = minimize(negative_log_likelihood, parameters, args=arguments, jac=True, method='L-BFGS-B',
+                      bounds=bounds, options={'maxiter': max_iterations})
+
+    attack, defence, home_advantage, rho = unpack_parameters(result.x, nb_teams)
+    fitted_parameters = {
+        'Teams': teams,
+        'Attack': attack.tolist(),
+        'Defence': defence.tolist(),
+        'HomeAdvantage': float(home_advantage),
+        'Rho': float(rho)
+    }
+    return fitted_parameters, result.nit
+
+
+# Expected goals of the home and away sides of each fixture, NaN for teams unknown to the fit
+def get_rates(parameters, home_teams, away_teams):
+    team_ids = {team: i for i, team in enumerate(parameters['Teams'])}
+    attack = np.append(parameters['Attack'], np.nan)
+    defence = np.append(parameters['Defence'], np.nan)
+    home_ids = np.array([team_ids.get(team, -1) for team in home_teams], dtype=int)
+    away_ids = np.array([team_ids.get(team, -1) for team in away_teams], dtype=int)
+
+    home_rates = np.exp(parameters['HomeAdvantage'] + attack[home_ids] + defence[away_ids])
+    away_rates = np.exp(attack[away_ids] + defence[home_ids])
+    return home_rates, away_rates
+
+
+# Score matrices of all fixtures, array of shape (n_fixtures, home goals, away goals)
+def get_score_matrices(parameters, home_teams, away_teams, max_goals=MAX_GOALS, renormalise=False):
+    home_rates, away_rates = get_rates(parameters, home_teams, away_teams)
+    home_probs = poisson_pmf(home_rates, max_goals, renormalise)
+    away_probs = poisson_pmf(away_rates, max_goals, renormalise)
+    score_matrices = home_probs[:, :, np.newaxis] * away_probs[:, np.newaxis, :]
+
+    rho = parameters['Rho']
+    score_matrices[:, 0, 0] *= 1 - home_rates * away_rates * rho
+    score_matrices[:, 0, 1] *= 1 + home_rates * rho
+    score_matrices[:, 1, 0] *= 1 + away_rates * rho
+    score_matrices[:, 1, 1] *= 1 - rho
+    return score_matrices
@@ -0,0 +1,34 @@
+import numpy as np
+from functools import lru_cache
+
+
+# Scorelines from 0 to MAX_GOALS - 1 goals are priced
+MAX_GOALS = 7
+
+# Rates are rounded to this number of decimals before being looked up in the memoised table
+RATE_DECIMALS = 6
+
+
+# Truncated Poisson probabilities of 0 to max_goals - 1 goals for a whole array of rates, on a
+# new last axis. With renormalise, the tail mass beyond the truncation is spread over the kept
+# scorelines so that they add up to 1.
+def poisson_pmf(rates, max_goals=MAX_GOALS, renormalise=False):
+    rates = np.asarray(rates, dtype=float)
+    probs = np.empty(rates.shape + (max_goals,))
+    probs[..., 0] = np.exp(-rates)
+    for goals in range(1, max_goals):
+        probs[..., goals] = probs[..., goals - 1] * rates / goals
+
+    if renormalise:
+        probs /= probs.sum(axis=-1, keepdims=True)
+    return probs
+
+
+@lru_cache(maxsize=4096)
+def _get_pmf_row(rate, max_goals, renormalise):
+    return tuple(poisson_pmf(rate, max_goals, renormalise).tolist())
+
+
+# Memoised probabilities of a single rate, for callers pricing one fixture at a time
+def cached_poisson_pmf(rate, max_goals=MAX_GOALS, renormalise=False):
+    return list(_get_pmf_row(round(float(rate), RATE_DECIMALS), max_goals, renormalise))
@@ -1,43 +1,43 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from scipy.stats import poisson
 import itertools
+import hashlib
+import json
+import os
 import logging
+import dixon_coles
+import storage
+from storage import load_table
+from goal_distribution import MAX_GOALS, cached_poisson_pmf, poisson_pmf
+from MatchHistory import MatchHistory, drop_duplicate_games
+from TeamStrengthIndex import TeamStrengthIndex
+from weighting import DEFAULT_DECAY, DEFAULT_KERNEL, HISTORY_DEPENDENT_KERNELS, YEAR_KERNELS, add_weights
 
 
-def add_weights(df):
-    # 'Date' column in datetime format
-    # If 'Date' is not in datetime format, convert it first:
-    df['Date'] = pd.to_datetime(df['Date'], format='%d/%m/%Y')
+DATASETS_PATH = storage.get_dataset_path(storage.CLEAN_FOLDER)
+STATE_FILE = f"{DATASETS_PATH}/PoissonState.json"
+DIXON_COLES_FILE = f"{DATASETS_PATH}/DixonColesParameters.json"
 
-    # Reference date
-    reference_date = pd.to_datetime(datetime.now())
+MODELS = ['poisson', 'dixon_coles']
 
-    # Calculate the difference in years from the reference date
-    df['YearsFromRef'] = reference_date.year - df['Date'].dt.year
-
-    # Apply an exponentially decaying weight based on years
-    # Adjust the decay rate as needed. A smaller decay rate means that the weight decreases more slowly.
-    decay_rate = 0.1  # Example decay rate
-    df['Weight'] = df['YearsFromRef'].apply(lambda x: 2.71828 ** (-decay_rate * x))
-
-    return df
-
-
-# Calculating weighted average goals for each team
-def weighted_avg_goals(df, team_column, goals_column):
-    return (df['Weight'] * df[goals_column]).sum() / df['Weight'].sum()
+# The polars engine prices every fixture from a lazy scan of the match history
+ENGINES = ['pandas', 'polars']
 
 
 # Adjusting for the opponent and applying Poisson model
-def predict_goals(team, opponent, home_or_away, df):
+def predict_goals(team, opponent, home_or_away, team_strength_index, max_goals=MAX_GOALS, renormalise=False):
+    # A weighted games DataFrame is still accepted, at the cost of indexing it on every call
+    if isinstance(team_strength_index, pd.DataFrame):
+        team_strength_index = TeamStrengthIndex.from_games(team_strength_index)
+
     # Weighted averages
-    team_goals_avg = weighted_avg_goals(df[df[home_or_away + 'Team'] == team], home_or_away + 'Team', home_or_away + 'TeamGoal')
-    opponent_def_avg = weighted_avg_goals(df[df[home_or_away + 'Team'] == opponent], home_or_away + 'Team', 'AwayTeamGoal' if home_or_away == 'Home' else 'HomeTeamGoal')
+    team_goals_avg, _ = team_strength_index.get_averages(team, home_or_away)
+    _, opponent_def_avg = team_strength_index.get_averages(opponent, home_or_away)
 
-    # Poisson probabilities for each scoreline up to 5 goals
+    # Poisson probabilities for each scoreline up to max_goals - 1 goals
     adjusted_avg = team_goals_avg * opponent_def_avg
-    return [poisson.pmf(i, adjusted_avg) for i in range(7)]
+    return cached_poisson_pmf(adjusted_avg, max_goals, renormalise)
 
 
 def get_match_probabilities(home_team, away_team, team_home_probs, team_away_probs):
@@ -74,33 +74,207 @@ def get_final_probabilities(home_team, away_team, df):
     return finalProbabilities
 
 
-def main():
+# Same rates as predict_goals, for every fixture at once: arrays of shape (n_fixtures, max_goals)
+def predict_all_goals(home_teams, away_teams, team_strength_index, max_goals=MAX_GOALS, renormalise=False):
+    home_rates, away_rates = team_strength_index.get_rates(home_teams, away_teams)
+    return poisson_pmf(home_rates, max_goals, renormalise), poisson_pmf(away_rates, max_goals, renormalise)
+
+
+# Score matrices of all fixtures: array of shape (n_fixtures, home goals, away goals)
+def get_all_match_probabilities(home_probs, away_probs):
+    return home_probs[:, :, np.newaxis] * away_probs[:, np.newaxis, :]
+
+
+def get_all_final_probabilities(home_teams, away_teams, score_matrices):
+    home_goals, away_goals = np.indices(score_matrices.shape[1:])
+    total_goals = home_goals + away_goals
+
+    masks = {
+        'Win': home_goals > away_goals,
+        'Draw': home_goals == away_goals,
+        'Loose': home_goals < away_goals,
+        'BothScore': (home_goals > 0) & (away_goals > 0),
+        'Over 1.5': total_goals > 1,
+        'Over 2.5': total_goals > 2,
+        'Over 3.5': total_goals > 3
+    }
+
+    finalProbabilities = {'HomeTeam': list(home_teams), 'AwayTeam': list(away_teams)}
+    for name, mask in masks.items():
+        finalProbabilities[name] = score_matrices[:, mask].sum(axis=1) * 100
+
+    return pd.DataFrame(finalProbabilities)
+
+
+# Batch equivalent of the predict_goals / get_match_probabilities / get_final_probabilities chain
+def predict_fixtures(fixtures_df, team_strength_index, max_goals=MAX_GOALS, renormalise=False):
+    home_teams = fixtures_df['HomeTeam'].to_numpy()
+    away_teams = fixtures_df['AwayTeam'].to_numpy()
+
+    home_probs, away_probs = predict_all_goals(home_teams, away_teams, team_strength_index, max_goals, renormalise)
+    score_matrices = get_all_match_probabilities(home_probs, away_probs)
+
+    return get_all_final_probabilities(home_teams, away_teams, score_matrices)
+
+
+# One content hash per game, so new rows of Game.csv can be told apart from known ones
+def hash_games(df):
+    games_df = df[['Date', 'HomeTeam', 'AwayTeam', 'HomeTeamGoal', 'AwayTeamGoal']].astype(str)
+    return pd.util.hash_pandas_object(games_df, index=False).tolist()
+
+
+def hash_table(df):
+    return hashlib.sha256(np.array(hash_games(df), dtype=np.uint64).tobytes()).hexdigest()
+
+
+def load_state(path=STATE_FILE):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_state(state, path=STATE_FILE):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(state, file)
+
+
+# Returns the team strength index, the teams whose aggregates changed (None when everything
+# was rebuilt) and the new state. Only new games are weighted and indexed when the state
+# matches the current past games, reference date and weighting settings. A rebuild with a
+# year-based kernel merges the aggregates of the match history, when one holding the games is given.
+def update_team_strength_index(state, past_games_df, games_df, kernel=DEFAULT_KERNEL, decay=DEFAULT_DECAY, max_goals=MAX_GOALS, renormalise=False, history=None):
+    settings = {'Kernel': kernel, 'Decay': float(decay), 'MaxGoals': max_goals, 'Renormalise': renormalise}
+    reference_date = pd.Timestamp(datetime.now()).normalize()
+    past_games_hash = hash_table(past_games_df)
+    game_hashes = hash_games(games_df)
+
+    is_reusable = (
+        state is not None
+        and state['ReferenceDate'] == reference_date.strftime('%d/%m/%Y')
+        and state['PastGamesHash'] == past_games_hash
+        and state['Settings'] == settings
+        and kernel not in HISTORY_DEPENDENT_KERNELS
+        and set(state['GameHashes']) <= set(game_hashes)
+    )
+
+    if is_reusable:
+        team_strength_index = TeamStrengthIndex.from_dict(state['TeamStrengthIndex'])
+        is_new_game = ~pd.Series(game_hashes).isin(state['GameHashes']).to_numpy()
+        new_games_df = games_df[is_new_game].copy()
+        if not new_games_df.empty:
+            team_strength_index.add_games(add_weights(new_games_df, kernel, decay, reference_date))
+        changed_teams = set(new_games_df['HomeTeam']) | set(new_games_df['AwayTeam'])
+    elif history is not None and kernel in YEAR_KERNELS:
+        team_strength_index = history.get_team_strength_index(kernel, decay, reference_date)
+        changed_teams = None
+    else:
+        all_games_df = add_weights(pd.concat([past_games_df, games_df]), kernel, decay, reference_date)
+        team_strength_index = TeamStrengthIndex.from_games(all_games_df)
+        changed_teams = None
+
+    state = {
+        'ReferenceDate': reference_date.strftime('%d/%m/%Y'),
+        'PastGamesHash': past_games_hash,
+        'Settings': settings,
+        'GameHashes': game_hashes,
+        'TeamStrengthIndex': team_strength_index.to_dict()
+    }
+    return team_strength_index, changed_teams, state
+
+
+# Re-price only the fixtures involving a changed team or missing from the previous outcomes,
+# previous rows of the other fixtures are kept as they are
+def update_outcomes(fixtures_df, team_strength_index, outcomes_df=None, changed_teams=None, max_goals=MAX_GOALS, renormalise=False):
+    if outcomes_df is None or changed_teams is None:
+        return predict_fixtures(fixtures_df, team_strength_index, max_goals, renormalise)
+
+    fixtures_df = fixtures_df.reset_index(drop=True)
+    previous_df = outcomes_df.drop_duplicates(subset=['HomeTeam', 'AwayTeam']).set_index(['HomeTeam', 'AwayTeam'])
+    fixture_keys = pd.MultiIndex.from_frame(fixtures_df[['HomeTeam', 'AwayTeam']])
+
+    is_stale = (
+        fixtures_df['HomeTeam'].isin(changed_teams).to_numpy()
+        | fixtures_df['AwayTeam'].isin(changed_teams).to_numpy()
+        | ~fixture_keys.isin(previous_df.index)
+    )
+
+    probabilities_df = previous_df.reindex(fixture_keys).reset_index()
+    if is_stale.any():
+        repriced_df = predict_fixtures(fixtures_df[is_stale], team_strength_index, max_goals, renormalise)
+        for column in repriced_df.columns:
+            probabilities_df.loc[is_stale, column] = repriced_df[column].to_numpy()
+
+    return probabilities_df
+
+
+# Dixon-Coles fit warm-started from the parameters of the previous run, all fixtures are re-priced
+def predict_fixtures_dixon_coles(fixtures_df, past_games_df, games_df, kernel=DEFAULT_KERNEL, decay=DEFAULT_DECAY, max_goals=MAX_GOALS, renormalise=False):
+    all_games_df = add_weights(pd.concat([past_games_df, games_df]), kernel, decay)
+    parameters, nb_iterations = dixon_coles.fit_dixon_coles(all_games_df, load_state(DIXON_COLES_FILE))
+
+    home_teams = fixtures_df['HomeTeam'].to_numpy()
+    away_teams = fixtures_df['AwayTeam'].to_numpy()
+    score_matrices = dixon_coles.get_score_matrices(parameters, home_teams, away_teams, max_goals, renormalise)
+
+    return get_all_final_probabilities(home_teams, away_teams, score_matrices), parameters, nb_iterations
+
+
+def main(kernel=DEFAULT_KERNEL, decay=DEFAULT_DECAY, model='poisson', max_goals=MAX_GOALS, renormalise=False, engine='pandas', tables=None):
     logging.info('Poisson Predictions.')
     logger = logging.getLogger('__predictions__')
     logger.setLevel(logging.INFO)
 
-    past_games_df = pd.read_csv("C:/Users/guygi/OneDrive/Bureau/concaf_analytics/datasets/clean/PastGames.csv")
-    games_df = pd.read_csv("C:/Users/guygi/OneDrive/Bureau/concaf_analytics/datasets/clean/Game.csv")
-    fixtures_df = pd.read_csv("C:/Users/guygi/OneDrive/Bureau/concaf_analytics/datasets/clean/Fixture.csv")
-    logger.info("Local datasets successfully read.")
+    past_games_df = load_table('PastGames', tables)
+    games_df = load_table('Game', tables)
+    fixtures_df = load_table('Fixture', tables)
+    outcomes_df = storage.read_table('Outcome') if storage.table_exists('Outcome') or storage.table_exists('Outcome', 'csv') else None
+    logger.info("Datasets successfully loaded.")
 
     past_games_df = past_games_df[['Date', 'HomeTeam', 'AwayTeam', 'HomeTeamGoal', 'AwayTeamGoal']]
-    all_games_df = pd.concat([past_games_df, games_df])
-    all_games_df = add_weights(all_games_df)
+    # Same games as the match history: a game found again (same date and teams) replaces the earlier row
+    past_games_df, games_df = drop_duplicate_games([past_games_df, games_df])
+
+    if model == 'dixon_coles':
+        probabilities_df, parameters, nb_iterations = predict_fixtures_dixon_coles(fixtures_df, past_games_df, games_df, kernel, decay, max_goals, renormalise)
+        logger.info(f"Dixon-Coles model fitted in {nb_iterations} iterations.")
+
+        probabilities_df = storage.write_table(probabilities_df, 'Outcome')
+        save_state(parameters, DIXON_COLES_FILE)
+        # Outcome.csv no longer matches the incremental Poisson state
+        if os.path.exists(STATE_FILE):
+            os.remove(STATE_FILE)
+        logger.info("Dixon-Coles predictions successfully saved in local computer!")
+        return {'Outcome': probabilities_df}
+
+    history = MatchHistory()
+    changed_years = history.append(past_games_df, source='PastGames') + history.append(games_df, source='Game')
+    logger.info(f"Match history updated for {len(set(changed_years))} editions.")
 
-    probabilities_list = []
-    for i in range(fixtures_df.shape[0]):
-        home_team = fixtures_df.iloc[i]['HomeTeam']
-        away_team = fixtures_df.iloc[i]['AwayTeam']
-        team_a_probs = predict_goals(home_team, away_team, 'Home', all_games_df)
-        team_b_probs = predict_goals(away_team, home_team, 'Away', all_games_df)
+    if engine == 'polars':
+        # Imported here so that the pandas engine, and the stages importing this module, do not load polars
+        import poisson_polars
+        reference_date = pd.Timestamp(datetime.now()).normalize()
+        probabilities_df = poisson_polars.predict_fixtures(fixtures_df, history.scan_games(), kernel, decay, max_goals, renormalise, reference_date)
 
-        match_probabilities = get_match_probabilities(home_team, away_team, team_a_probs, team_b_probs)
-        finalProbabilities = get_final_probabilities(home_team, away_team, match_probabilities)
+        probabilities_df = storage.write_table(probabilities_df, 'Outcome')
+        # Outcome.csv no longer matches the incremental Poisson state
+        if os.path.exists(STATE_FILE):
+            os.remove(STATE_FILE)
+        logger.info("Poisson predictions (polars) successfully saved in local computer!")
+        return {'Outcome': probabilities_df}
 
-        probabilities_list.append(finalProbabilities)
+    team_strength_index, changed_teams, state = update_team_strength_index(
+        load_state(STATE_FILE), past_games_df, games_df, kernel, decay, max_goals, renormalise, history
+        )
+    if changed_teams is None:
+        logger.info("Team strength index rebuilt from the full history.")
+    else:
+        logger.info(f"Team strength index updated for {len(changed_teams)} teams.")
 
-    probabilities_df = pd.DataFrame(probabilities_list)
+    probabilities_df = update_outcomes(fixtures_df, team_strength_index, outcomes_df, changed_teams, max_goals, renormalise)
 
-    probabilities_df.to_csv("C:/Users/guygi/OneDrive/Bureau/concaf_analytics/datasets/clean/Outcome.csv", encoding='utf-8-sig', index=False)
+    probabilities_df = storage.write_table(probabilities_df, 'Outcome')
+    save_state(state, STATE_FILE)
     logger.info("Poisson predictions successfully saved in local computer!")
+    return {'Outcome': probabilities_df}
@@ -0,0 +1,143 @@
+import polars as pl
+import pandas as pd
+from datetime import datetime
+from math import factorial
+from goal_distribution import MAX_GOALS
+from weighting import DEFAULT_DECAY, DEFAULT_KERNEL, DAYS_PER_YEAR, parse_dates
+
+
+# Polars version of the Poisson predictions: weighting, per-team aggregation and the reduction of
+# the score matrices to outcome probabilities are expressed on LazyFrames, so that the whole
+# prediction is one query plan run on all cores. Same results as poisson_implementation.predict_fixtures.
+
+
+# Pandas frames (typed by storage or read from CSV) and polars frames are accepted. Team names
+# are joined as strings, categories of different frames could not be compared.
+def to_lazy(df):
+    if isinstance(df, pl.LazyFrame):
+        return df
+    if isinstance(df, pd.DataFrame):
+        df = df.copy()
+        if 'Date' in df.columns:
+            df = parse_dates(df)
+        df = pl.from_pandas(df)
+    return df.lazy().with_columns(pl.col(pl.Categorical).cast(pl.Utf8))
+
+
+# Same kernels as weighting.KERNELS, as expressions on the 'Date' column
+def get_weight_expression(kernel, decay, reference_date):
+    years_from_ref = reference_date.year - pl.col('Date').dt.year()
+    days_from_ref = (pl.lit(reference_date) - pl.col('Date')).dt.total_days()
+
+    if kernel == 'exponential':
+        return (-decay * years_from_ref).exp()
+    if kernel == 'exponential_days':
+        return (-decay * days_from_ref / DAYS_PER_YEAR).exp()
+    if kernel == 'half_life':
+        return pl.lit(0.5).pow(days_from_ref / DAYS_PER_YEAR / decay)
+    if kernel == 'edition_step':
+        # Editions up to the reference date ranked from the most recent one
+        past_edition = pl.when(pl.col('Date').dt.year() <= reference_date.year).then(pl.col('Date').dt.year())
+        rank = past_edition.rank('dense', descending=True)
+        return (rank <= int(decay)).fill_null(False).cast(pl.Float64)
+    raise ValueError(f"Unknown kernel '{kernel}'")
+
+
+def add_weights(games, kernel=DEFAULT_KERNEL, decay=DEFAULT_DECAY, reference_date=None):
+    reference_date = pd.Timestamp(datetime.now() if reference_date is None else reference_date).to_pydatetime()
+    return to_lazy(games).with_columns(get_weight_expression(kernel, decay, reference_date).alias('Weight'))
+
+
+# Weighted average goals scored and conceded by each team at home and away, as in TeamStrengthIndex.
+# With 'teams' (a LazyFrame with a 'Team' column), only the games of those teams are aggregated.
+def get_team_averages(weighted_games, teams=None):
+    venue_games = pl.concat([
+        weighted_games.select(
+            pl.col(venue + 'Team').alias('Team'),
+            pl.lit(venue).alias('Venue'),
+            'Weight',
+            (pl.col('Weight') * pl.col(venue + 'TeamGoal')).alias('Scored'),
+            (pl.col('Weight') * pl.col(opponent + 'TeamGoal')).alias('Conceded')
+        )
+        for venue, opponent in [('Home', 'Away'), ('Away', 'Home')]
+    ])
+    if teams is not None:
+        venue_games = venue_games.join(teams, on='Team', how='semi')
+
+    averages = []
+    for venue in ['Home', 'Away']:
+        weight_sum = pl.col('Weight').filter(pl.col('Venue') == venue).sum()
+        averages += [
+            (pl.col('Scored').filter(pl.col('Venue') == venue).sum() / weight_sum).alias(venue + 'Scored'),
+            (pl.col('Conceded').filter(pl.col('Venue') == venue).sum() / weight_sum).alias(venue + 'Conceded')
+        ]
+    return venue_games.group_by('Team').agg(averages)
+
+
+# Expected goals of both sides of each fixture. Only the games of teams playing a fixture are
+# aggregated, a team without history gets NaN rates like in get_rates.
+def get_rates(fixtures, weighted_games):
+    fixture_teams = pl.concat([fixtures.select(pl.col('HomeTeam').alias('Team')), fixtures.select(pl.col('AwayTeam').alias('Team'))]).unique()
+    team_averages = get_team_averages(weighted_games, fixture_teams)
+
+    home_averages = team_averages.select(
+        pl.col('Team').alias('HomeTeam'), pl.col('HomeScored').alias('HomeTeamScored'), pl.col('AwayConceded').alias('HomeTeamConceded'))
+    away_averages = team_averages.select(
+        pl.col('Team').alias('AwayTeam'), pl.col('AwayScored').alias('AwayTeamScored'), pl.col('HomeConceded').alias('AwayTeamConceded'))
+
+    return (
+        fixtures
+        .join(home_averages, on='HomeTeam', how='left')
+        .join(away_averages, on='AwayTeam', how='left')
+        .sort('FixtureID')
+        .select(
+            'HomeTeam', 'AwayTeam',
+            (pl.col('HomeTeamScored') * pl.col('AwayTeamConceded')).fill_null(float('nan')).alias('HomeRate'),
+            (pl.col('AwayTeamScored') * pl.col('HomeTeamConceded')).fill_null(float('nan')).alias('AwayRate')
+        )
+    )
+
+
+# Truncated Poisson probabilities of 0 to max_goals - 1 goals, one expression per scoreline
+def get_pmf_expressions(rate, max_goals=MAX_GOALS, renormalise=False):
+    probs = [(-pl.col(rate)).exp() * pl.col(rate).pow(goals) / factorial(goals) for goals in range(max_goals)]
+    if renormalise:
+        total = pl.sum_horizontal(probs)
+        probs = [prob / total for prob in probs]
+    return probs
+
+
+# Outcome probabilities in percent, as get_all_final_probabilities reduces the score matrices
+def get_outcomes(rates, max_goals=MAX_GOALS, renormalise=False):
+    home_probs = [prob.alias(f"Home{goals}") for goals, prob in enumerate(get_pmf_expressions('HomeRate', max_goals, renormalise))]
+    away_probs = [prob.alias(f"Away{goals}") for goals, prob in enumerate(get_pmf_expressions('AwayRate', max_goals, renormalise))]
+
+    masks = {
+        'Win': lambda home, away: home > away,
+        'Draw': lambda home, away: home == away,
+        'Loose': lambda home, away: home < away,
+        'BothScore': lambda home, away: home > 0 and away > 0,
+        'Over 1.5': lambda home, away: home + away > 1,
+        'Over 2.5': lambda home, away: home + away > 2,
+        'Over 3.5': lambda home, away: home + away > 3
+    }
+
+    scorelines = [(home, away) for home in range(max_goals) for away in range(max_goals)]
+    outcomes = [
+        (pl.sum_horizontal([pl.col(f"Home{home}") * pl.col(f"Away{away}") for home, away in scorelines if mask(home, away)]) * 100).alias(name)
+        for name, mask in masks.items()
+    ]
+    return rates.with_columns(home_probs + away_probs).select(['HomeTeam', 'AwayTeam'] + outcomes)
+
+
+# Query plan of the outcome probabilities of the fixtures given the games played
+def get_prediction_plan(fixtures, games, kernel=DEFAULT_KERNEL, decay=DEFAULT_DECAY, max_goals=MAX_GOALS, renormalise=False, reference_date=None):
+    fixtures = to_lazy(fixtures).select('HomeTeam', 'AwayTeam').with_row_index('FixtureID')
+    weighted_games = add_weights(games, kernel, decay, reference_date)
+    return get_outcomes(get_rates(fixtures, weighted_games), max_goals, renormalise)
+
+
+# Same output as poisson_implementation.predict_fixtures on the weighted games
+def predict_fixtures(fixtures, games, kernel=DEFAULT_KERNEL, decay=DEFAULT_DECAY, max_goals=MAX_GOALS, renormalise=False, reference_date=None):
+    probabilities = get_prediction_plan(fixtures, games, kernel, decay, max_goals, renormalise, reference_date).collect()
+    return probabilities.to_pandas()
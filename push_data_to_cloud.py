@@ -1,9 +1,11 @@
-import re
-import pandas as pd
-import polars as pl
 from io import BytesIO
-from azure.storage.blob import BlobServiceClient
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+import hashlib
 import logging
+import storage
+from storage import load_table
+from BlobStorage import AzureBlobStorage
 
 
 PLAYER = 'Player'
@@ -13,47 +15,56 @@ FIXTURES = 'Fixture'
 OUTCOMES = 'Outcome'
 GAMES = 'Game'
 PAST_GAMES = 'PastGames'
+SIMULATION = 'Simulation'
+DASHBOARD_AGGREGATES = 'DashboardAggregates'
 
-players_df = pd.read_csv(f"C:/Users/guygi/OneDrive/Bureau/concaf_analytics/datasets/clean/{PLAYER}.csv")
-nations_df = pd.read_csv(f"C:/Users/guygi/OneDrive/Bureau/concaf_analytics/datasets/clean/{NATION}.csv")
-clubs_df = pd.read_csv(f"C:/Users/guygi/OneDrive/Bureau/concaf_analytics/datasets/clean/{CLUB}.csv")
-fixtures_df = pd.read_csv(f"C:/Users/guygi/OneDrive/Bureau/concaf_analytics/datasets/clean/{FIXTURES}.csv")
-outcomes_df = pd.read_csv(f"C:/Users/guygi/OneDrive/Bureau/concaf_analytics/datasets/clean/{OUTCOMES}.csv")
-games_df = pd.read_csv(f"C:/Users/guygi/OneDrive/Bureau/concaf_analytics/datasets/clean/{GAMES}.csv")
-past_games_df = pd.read_csv(f"C:/Users/guygi/OneDrive/Bureau/concaf_analytics/datasets/clean/{PAST_GAMES}.csv")
+CONTAINER_NAME = "coupe-afrique"
 
+# Metadata key of the SHA-256 of the uploaded parquet, used to skip unchanged tables
+CONTENT_HASH_KEY = 'content_sha256'
 
-def create_blob_client_with_connection_string(connection_string):
-    connection_string = re.sub(r'%2B', '+', connection_string)
-    blob_service_client = BlobServiceClient.from_connection_string(connection_string)
-    return blob_service_client
+TABLES = [PLAYER, CLUB, NATION, GAMES, FIXTURES, OUTCOMES, PAST_GAMES, SIMULATION, DASHBOARD_AGGREGATES]
 
 
+# The index is left out, frames handed over in memory may still carry a filtered or sorted one
 def from_pandas_to_parquet(df):
     parquet_file = BytesIO()
-    df.to_parquet(parquet_file, engine = 'pyarrow')
+    df.to_parquet(parquet_file, engine = 'pyarrow', index=False)
     return parquet_file
 
 
-def main():
+# Upload a table unless the blob already holds the same content. Returns whether it was uploaded.
+# The dashboard gets the plain columns of the original CSVs, whatever the local schema.
+def upload_table(blob_storage, df_name, tables=None):
+    data = from_pandas_to_parquet(storage.to_export_frame(load_table(df_name, tables))).getvalue()
+    content_hash = hashlib.sha256(data).hexdigest()
+    blob_name = f"{df_name}.parquet"
+
+    metadata = blob_storage.get_metadata(blob_name)
+    if metadata is not None and metadata.get(CONTENT_HASH_KEY) == content_hash:
+        return False
+    blob_storage.upload(blob_name, data, {CONTENT_HASH_KEY: content_hash})
+    return True
+
+
+def main(tables=None, blob_storage=None, max_workers=4):
 
     logging.info('Data Uploaded to the Azure Blob Storage.')
     logger = logging.getLogger('__To_Azure_Blob_Storage__')
     logger.setLevel(logging.INFO)
 
-    # Create a blob client
-    connection_string = "DefaultEndpointsProtocol=https;AccountName=storagefootanalysis;AccountKey=UHMmYUJDVHJI1IhTCy/2UXVqjoRJYw2gJTKNPQ8jL9juuD5cJeNMIYXwXbkpfSEIE3cByx%2BkQ29e%2BAStk2zvmQ==;EndpointSuffix=core.windows.net"
-    blob_service_client = create_blob_client_with_connection_string(connection_string)
-    logger.info(f"Successfully created blob client\n")
-
-    container_name = "coupe-afrique"
-    logger.info(f"Successfully got container client for {container_name} container.\n")
+    if blob_storage is None:
+        # Create a blob client
+        connection_string = "DefaultEndpointsProtocol=https;AccountName=storagefootanalysis;AccountKey=UHMmYUJDVHJI1IhTCy/2UXVqjoRJYw2gJTKNPQ8jL9juuD5cJeNMIYXwXbkpfSEIE3cByx%2BkQ29e%2BAStk2zvmQ==;EndpointSuffix=core.windows.net"
+        blob_storage = AzureBlobStorage(connection_string, CONTAINER_NAME)
+        logger.info(f"Successfully got container client for {CONTAINER_NAME} container.\n")
 
-    file_names = ['Player', 'Club', 'Nation', 'Game', 'Fixture', 'Outcome', 'PastGames']
-    dataframes = [players_df, clubs_df, nations_df, games_df, fixtures_df, outcomes_df, past_games_df]
+    # Tables are loaded, converted and uploaded concurrently, the ones not given are read from disk
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        uploaded = list(executor.map(upload_table, repeat(blob_storage), TABLES, repeat(tables)))
 
-    for df_name, df in zip(file_names, dataframes):
-        parquet_buffer = from_pandas_to_parquet(df)
-        blob_client = blob_service_client.get_blob_client(container=container_name, blob=f"{df_name}.parquet")
-        blob_client.upload_blob(parquet_buffer.getvalue(), blob_type="BlockBlob", overwrite=True)
-        logger.info(f"Successfully uploaded {df_name} to {container_name} container !\n")
+    for df_name, is_uploaded in zip(TABLES, uploaded):
+        if is_uploaded:
+            logger.info(f"Successfully uploaded {df_name} !\n")
+        else:
+            logger.info(f"{df_name} unchanged, upload skipped.")
@@ -1,16 +1,28 @@
-import create_result_fixture_tables
-import poisson_implementation
-import push_data_to_cloud
 import logging
+from Pipeline import Pipeline, Stage
+from push_data_to_cloud import TABLES
 
 logging.info('Data Uploaded to the Azure Blob Storage.')
 logger = logging.getLogger('__To_Azure_Blob_Storage__')
 logger.setLevel(logging.INFO)
 
+# Stage modules are imported when their stage runs. Scrapers always run and keep their previous
+# table when the page did not change, the other stages are skipped when their inputs did not change.
+STAGES = [
+    Stage('Fixtures', 'create_result_fixture_tables.scrape_fixtures', [], ['Fixture'], cacheable=False),
+    Stage('Results', 'create_result_fixture_tables.scrape_results', [], ['Game'], cacheable=False),
+    # After the games, so that players whose nation just played get their profile refreshed
+    Stage('Players', 'create_player_club_tables.main', ['Game'], ['Player', 'Club', 'Nation'], cacheable=False),
+    Stage('Predictions', 'poisson_implementation.main', ['PastGames', 'Game', 'Fixture'], ['Outcome']),
+    Stage('Simulation', 'tournament_simulation.main', ['PastGames', 'Game', 'Fixture'], ['Simulation']),
+    Stage('DashboardAggregates', 'dashboard_aggregates.main', ['Player', 'Club', 'Nation', 'Game'], ['DashboardAggregates']),
+    Stage('Upload', 'push_data_to_cloud.main', TABLES, []),
+]
+
 if __name__ == "__main__":
-    create_result_fixture_tables.main()
-    logger.info("'Fixture' and 'Game' tables saved locally")
-    poisson_implementation.main()
-    logger.info("'Outcomes' table saved locally")
-    push_data_to_cloud.main()
-    logger.info("Tables saved in Azure Storage Account")
+    logging.getLogger('__pipeline__').setLevel(logging.INFO)
+
+    import storage
+    pipeline = Pipeline(STAGES, storage.read_table, state_file=storage.get_dataset_path('PipelineState.json'))
+    tables, timings = pipeline.run()
+    logger.info(f"Tables saved in Azure Storage Account\n{timings.to_string(index=False)}")
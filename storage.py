@@ -0,0 +1,119 @@
+import pandas as pd
+import os
+
+
+# Root of the datasets, can be moved with the CONCAF_DATASETS_ROOT environment variable
+DATASETS_ROOT = os.environ.get('CONCAF_DATASETS_ROOT', "C:/Users/guygi/OneDrive/Bureau/concaf_analytics/datasets")
+CLEAN_FOLDER = 'clean'
+
+FILE_FORMATS = ['parquet', 'csv']
+DEFAULT_FORMAT = os.environ.get('CONCAF_FILE_FORMAT', 'parquet')
+
+# A CSV copy of every table written is kept next to the parquet when CONCAF_EXPORT_CSV is set
+EXPORT_CSV = bool(os.environ.get('CONCAF_EXPORT_CSV'))
+
+# Dates are stored as dates, but shown and exported as in the original CSVs
+DATE_FORMAT = '%d/%m/%Y'
+
+DATE = 'date'
+TEAM = 'category'
+GOALS = 'int8'
+
+SCHEMAS = {
+    'PastGames': {'Date': DATE, 'HomeTeam': TEAM, 'AwayTeam': TEAM, 'HomeTeamGoal': GOALS, 'AwayTeamGoal': GOALS,
+                  'Stage': 'category', 'SpecialWinConditions': 'string'},
+    'Game': {'Date': DATE, 'HomeTeam': TEAM, 'AwayTeam': TEAM, 'HomeTeamGoal': GOALS, 'AwayTeamGoal': GOALS},
+    'Fixture': {'Date': DATE, 'HomeTeam': TEAM, 'AwayTeam': TEAM},
+    'Outcome': {'HomeTeam': TEAM, 'AwayTeam': TEAM, 'Win': 'float64', 'Draw': 'float64', 'Loose': 'float64',
+                'BothScore': 'float64', 'Over 1.5': 'float64', 'Over 2.5': 'float64', 'Over 3.5': 'float64'},
+    'Simulation': {'Nation': TEAM},
+    'Player': {'PlayerID': 'int64', 'PlayerName': 'string', 'Age': 'int16', 'NationID': 'int32',
+               'Position': 'category', 'MarketValue': 'float64', 'Cap': 'int16', 'Goal': 'int16', 'ClubID': 'int32'},
+    'Club': {'Club': 'string', 'ClubID': 'int32', 'Country': 'category', 'BestClub': 'bool', 'TopLeague': 'bool'},
+    'Nation': {'NationID': 'int32', 'Nationality': TEAM, 'CommonPosition': 'category'},
+    'DashboardAggregates': {'Section': 'category', 'Name': 'string', 'Value': 'float64'}
+}
+
+
+def get_dataset_path(file_name):
+    return f"{DATASETS_ROOT}/{file_name}"
+
+
+def get_table_path(name, file_format=None):
+    return get_dataset_path(f"{CLEAN_FOLDER}/{name}.{file_format or DEFAULT_FORMAT}")
+
+
+# Cast the columns of a known table to their schema. Goals stay floating point when some are
+# missing, as int8 cannot hold NaN; columns missing from the frame are ignored.
+def apply_schema(df, name):
+    df = df.copy()
+    for column, dtype in SCHEMAS.get(name, {}).items():
+        if column not in df.columns:
+            continue
+        if dtype == DATE:
+            if not pd.api.types.is_datetime64_any_dtype(df[column]):
+                df[column] = pd.to_datetime(df[column], format=DATE_FORMAT)
+        elif dtype == GOALS and df[column].isna().any():
+            df[column] = df[column].astype('float32')
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+# Plain columns as in the original CSVs: dates as text, categories and strings as objects,
+# small integers widened. Used for the CSV export and for the tables served to the dashboard.
+def to_export_frame(df):
+    df = df.copy()
+    for column in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = df[column].dt.strftime(DATE_FORMAT)
+        elif isinstance(df[column].dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(df[column]):
+            df[column] = df[column].astype(object).where(df[column].notna(), None)
+        elif pd.api.types.is_integer_dtype(df[column]):
+            df[column] = df[column].astype('int64')
+    return df
+
+
+def table_exists(name, file_format=None):
+    return os.path.exists(get_table_path(name, file_format))
+
+
+# Untyped read and write of a frame, the format is given by the extension of the path
+def read_frame(path, columns=None):
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path, columns=columns, engine='pyarrow')
+    return pd.read_csv(path, usecols=columns, float_precision='round_trip')
+
+
+def write_frame(df, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if path.endswith('.parquet'):
+        df.to_parquet(path, engine='pyarrow', index=False)
+    else:
+        to_export_frame(df).to_csv(path, encoding='utf-8-sig', index=False)
+
+
+# Tables are read from parquet by default. A table only available as CSV, as written before
+# the move to parquet, is read from the CSV and typed the same way.
+def read_table(name, columns=None, file_format=None):
+    file_format = file_format or DEFAULT_FORMAT
+    if file_format == 'parquet' and not table_exists(name, 'parquet') and table_exists(name, 'csv'):
+        file_format = 'csv'
+    return apply_schema(read_frame(get_table_path(name, file_format), columns), name)
+
+
+# Table produced in memory by an earlier stage of the run, read from the local datasets otherwise
+def load_table(name, tables=None):
+    if tables is not None and name in tables:
+        return tables[name]
+    return read_table(name)
+
+
+# Writes the typed table and returns it, optionally with a CSV copy
+def write_table(df, name, file_format=None, export_csv=EXPORT_CSV):
+    file_format = file_format or DEFAULT_FORMAT
+    df = apply_schema(df, name)
+    write_frame(df, get_table_path(name, file_format))
+    if file_format != 'csv' and export_csv:
+        write_frame(df, get_table_path(name, 'csv'))
+    return df
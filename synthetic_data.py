@@ -0,0 +1,128 @@
+import pandas as pd
+import numpy as np
+
+
+# Synthetic tables shaped like the scraped ones, to measure the pipeline beyond a single tournament
+
+FIRST_YEAR = 1957
+
+POSITIONS = ['Keeper', 'Defense', 'Midfield', 'Offense']
+POSITION_SHARES = [0.1, 0.35, 0.3, 0.25]
+STAGES = ['Group', 'Round of 16', 'Quarter-finals', 'Semi-finals', 'Third place', 'Final']
+STAGE_SHARES = [0.7, 0.1, 0.08, 0.06, 0.03, 0.03]
+LEAGUE_COUNTRIES = ['FR', 'ESP', 'GER', 'IT', 'ENG', 'POR', 'UKR']
+
+
+def get_team_names(nb_teams):
+    return [f"Team {i:04d}" for i in range(nb_teams)]
+
+
+# Games between random teams, one edition per year ending with the current one. Each team has
+# its own attack and defence strength so that the predictions are not all alike.
+def generate_games(nb_games=1_000_000, nb_teams=200, nb_editions=None, seed=0, last_year=None):
+    rng = np.random.default_rng(seed)
+    last_year = pd.Timestamp.now().year if last_year is None else last_year
+    nb_editions = last_year - FIRST_YEAR + 1 if nb_editions is None else nb_editions
+
+    teams = np.array(get_team_names(nb_teams))
+    attack = rng.lognormal(0.2, 0.3, nb_teams)
+    defence = rng.lognormal(0, 0.3, nb_teams)
+
+    home_ids = rng.integers(0, nb_teams, nb_games)
+    away_ids = (home_ids + rng.integers(1, nb_teams, nb_games)) % nb_teams
+
+    years = rng.integers(last_year - nb_editions + 1, last_year + 1, nb_games)
+    days = rng.integers(0, 28, nb_games)
+    dates = pd.to_datetime(years.astype(str), format='%Y') + pd.to_timedelta(days, unit='D')
+
+    return pd.DataFrame({
+        'Date': dates,
+        'HomeTeam': teams[home_ids],
+        'AwayTeam': teams[away_ids],
+        'HomeTeamGoal': rng.poisson(attack[home_ids] * defence[away_ids]),
+        'AwayTeamGoal': rng.poisson(attack[away_ids] * defence[home_ids] * 0.8)
+    }).sort_values('Date', kind='stable').reset_index(drop=True)
+
+
+# Past editions up to the previous year, with the stage of each game and the winner of the games
+# decided on penalties
+def generate_past_games(nb_games=1_000_000, nb_teams=200, seed=0, last_year=None):
+    rng = np.random.default_rng(seed + 1)
+    last_year = pd.Timestamp.now().year if last_year is None else last_year
+    past_games_df = generate_games(nb_games, nb_teams, seed=seed, last_year=last_year - 1)
+
+    past_games_df['Stage'] = rng.choice(STAGES, len(past_games_df), p=STAGE_SHARES)
+    is_penalties = ((past_games_df['Stage'] != 'Group') & (past_games_df['HomeTeamGoal'] == past_games_df['AwayTeamGoal'])).to_numpy()
+    winners = np.where(rng.random(len(past_games_df)) < 0.5, past_games_df['HomeTeam'], past_games_df['AwayTeam'])
+    past_games_df['SpecialWinConditions'] = np.where(is_penalties, pd.Series(winners) + ' won on penalties', None)
+    return past_games_df
+
+
+# Every pairing of a round robin between the first nb_teams teams
+def generate_fixtures(nb_teams=24, date=None):
+    teams = get_team_names(nb_teams)
+    date = pd.Timestamp.now().normalize() if date is None else pd.Timestamp(date)
+    pairs = [(home, away) for i, home in enumerate(teams) for away in teams[i + 1:]]
+    return pd.DataFrame({
+        'Date': date,
+        'HomeTeam': [home for home, _ in pairs],
+        'AwayTeam': [away for _, away in pairs]
+    })
+
+
+# Player, Club and Nation tables as created by create_player_club_tables.create_tables
+def generate_squads(nb_players=100_000, nb_nations=200, nb_clubs=5_000, seed=0):
+    rng = np.random.default_rng(seed + 2)
+
+    clubs_df = pd.DataFrame({
+        'Club': [f"Club {i:05d}" for i in range(nb_clubs)],
+        'ClubID': np.arange(nb_clubs),
+        'Country': rng.choice(LEAGUE_COUNTRIES + ['No'], nb_clubs, p=[0.05] * len(LEAGUE_COUNTRIES) + [0.65]),
+    })
+    clubs_df['TopLeague'] = clubs_df['Country'] != 'No'
+    clubs_df['BestClub'] = clubs_df['TopLeague'] & (rng.random(nb_clubs) < 0.2)
+    clubs_df = clubs_df.sort_values(by=['BestClub'], ascending=False, kind='stable')
+
+    nation_ids = rng.integers(0, nb_nations, nb_players)
+    players_df = pd.DataFrame({
+        'PlayerID': rng.permutation(10 * nb_players)[:nb_players],
+        'ShirtNumber': rng.integers(1, 27, nb_players),
+        'PlayerName': [f"Player {i:06d}" for i in range(nb_players)],
+        'Age': rng.integers(17, 40, nb_players),
+        'NationID': nation_ids,
+        'Position': rng.choice(POSITIONS, nb_players, p=POSITION_SHARES),
+        'MarketValue': np.round(rng.lognormal(13, 1.5, nb_players), -3),
+        'Cap': rng.integers(0, 120, nb_players),
+        'Goal': rng.integers(0, 40, nb_players),
+        'ClubID': rng.integers(0, nb_clubs, nb_players)
+    })
+
+    nation_names = pd.Series(get_team_names(nb_nations))
+    nation_df = players_df.groupby('NationID').agg(
+        TotalPlayers=pd.NamedAgg(column='PlayerID', aggfunc='count'),
+        SumMarketValue=pd.NamedAgg(column='MarketValue', aggfunc='sum'),
+        MedianMarketValue=pd.NamedAgg(column='MarketValue', aggfunc='median'),
+        AverageMarketValue=pd.NamedAgg(column='MarketValue', aggfunc='mean'),
+        AgeAverage=pd.NamedAgg(column='Age', aggfunc='mean'),
+        AverageCap=pd.NamedAgg(column='Cap', aggfunc='mean')
+    ).reset_index()
+    nation_df.insert(1, 'Nationality', nation_names[nation_df['NationID']].to_numpy())
+    nation_df['NationRanking'] = rng.permutation(len(nation_df)) + 1
+    nation_df['CommonPosition'] = players_df.groupby('NationID')['Position'].agg(lambda positions: positions.mode()[0]).to_numpy()
+
+    return players_df, clubs_df, nation_df
+
+
+# All scraped tables at the given scale, the fixtures and results being those of a tournament
+# between the first nb_fixture_teams nations
+def generate_tables(nb_nations=200, nb_players=100_000, nb_clubs=5_000, nb_past_games=1_000_000, nb_fixture_teams=24, seed=0):
+    players_df, clubs_df, nation_df = generate_squads(nb_players, nb_nations, nb_clubs, seed)
+    year = pd.Timestamp.now().year
+    return {
+        'Player': players_df,
+        'Club': clubs_df,
+        'Nation': nation_df,
+        'PastGames': generate_past_games(nb_past_games, nb_nations, seed, last_year=year),
+        'Game': generate_games(nb_fixture_teams * 3, nb_fixture_teams, nb_editions=1, seed=seed, last_year=year),
+        'Fixture': generate_fixtures(nb_fixture_teams)
+    }
@@ -0,0 +1,34 @@
+import time
+from AsyncPageFetcher import AsyncPageFetcher
+from PageFetcher import FileTransport
+
+
+def test_fetch_many_after_ttl_sends_conditional_request(url, file_transport, tmp_path):
+    fetcher = AsyncPageFetcher(file_transport, cache_dir=str(tmp_path / 'cache'), ttl=0)
+
+    first, _ = fetcher.fetch_many([url, url])
+    second, = fetcher.fetch_many([url])
+
+    assert len(file_transport.requests) == 2
+    assert file_transport.requests[1]['If-None-Match'] == first.etag
+    assert not second.modified and second.content == first.content
+
+
+def test_fetch_many_reads_lower_case_validators(url, lower_case_transport, tmp_path):
+    fetcher = AsyncPageFetcher(lower_case_transport, cache_dir=str(tmp_path / 'cache'), ttl=0)
+
+    assert fetcher.fetch(url).etag == '"v1"'
+    assert not fetcher.fetch(url).modified
+    assert lower_case_transport.requests[1]['If-None-Match'] == '"v1"'
+
+
+def test_rate_limit_spans_batches(url, page):
+    pages = {f"{url}/{i}": page for i in range(4)}
+    fetcher = AsyncPageFetcher(FileTransport(pages), rate_limit=20, burst=1)
+
+    start = time.monotonic()
+    fetcher.fetch_many(list(pages)[:2])
+    fetcher.fetch_many(list(pages)[2:])
+
+    # One token at once, then one every 1/20 s: the last three requests wait 0.15 s in total
+    assert time.monotonic() - start >= 0.14
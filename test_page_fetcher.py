@@ -0,0 +1,57 @@
+import pytest
+import requests
+from PageFetcher import PageFetcher, FileTransport
+
+
+def test_file_transport(url, page):
+    transport = FileTransport({url: page})
+
+    response = transport.get(url, {}, 10)
+    assert response.status_code == 200
+    assert response.content == b'<html>page</html>'
+    assert response.headers['etag'] == response.headers['ETag']
+
+    assert transport.get(url, {'If-None-Match': response.headers['ETag']}, 10).status_code == 304
+    assert transport.get('https://www.example.com/missing', {}, 10).status_code == 404
+
+
+def test_fetch_within_ttl_uses_cache(url, file_transport, tmp_path):
+    fetcher = PageFetcher(file_transport, cache_dir=str(tmp_path / 'cache'), ttl=300)
+
+    first = fetcher.fetch(url)
+    second = fetcher.fetch(url)
+
+    assert first.modified and not second.modified
+    assert second.content == first.content
+    assert len(file_transport.requests) == 1
+
+
+def test_fetch_after_ttl_sends_conditional_request(url, file_transport, tmp_path):
+    fetcher = PageFetcher(file_transport, cache_dir=str(tmp_path / 'cache'), ttl=0)
+
+    first = fetcher.fetch(url)
+    second = fetcher.fetch(url)
+
+    assert file_transport.requests[1]['If-None-Match'] == first.etag
+    assert 'If-Modified-Since' in file_transport.requests[1]
+    assert not second.modified
+    assert second.content == first.content
+    assert second.etag == first.etag
+
+
+def test_fetch_reads_lower_case_validators(url, lower_case_transport, tmp_path):
+    fetcher = PageFetcher(lower_case_transport, cache_dir=str(tmp_path / 'cache'), ttl=0)
+
+    first = fetcher.fetch(url)
+    second = fetcher.fetch(url)
+
+    assert first.etag == '"v1"'
+    assert lower_case_transport.requests[1]['If-None-Match'] == '"v1"'
+    assert lower_case_transport.requests[1]['If-Modified-Since'] == 'Mon, 01 Jan 2024 00:00:00 GMT'
+    assert not second.modified and second.content == b'<html>page</html>'
+
+
+def test_fetch_raises_on_missing_page(url, tmp_path):
+    fetcher = PageFetcher(FileTransport({}), cache_dir=str(tmp_path / 'cache'), max_retries=0)
+    with pytest.raises(requests.HTTPError):
+        fetcher.fetch(url)
@@ -0,0 +1,60 @@
+import pandas as pd
+from tournament_simulation import build_tournament, get_knockout_winners, simulate_tournament
+from TeamStrengthIndex import TeamStrengthIndex
+from weighting import add_weights
+
+
+def get_games(rows):
+    return pd.DataFrame(rows, columns=['Date', 'HomeTeam', 'AwayTeam', 'HomeTeamGoal', 'AwayTeamGoal'])
+
+
+# AFCON 2024 from the semi-finals: Nigeria beat South Africa on penalties, South Africa then beat
+# Congo on penalties in the third-place match
+SEMI_FINALS = [
+    ('07/02/2024', 'Nigeria', 'South Africa', 1, 1),
+    ('07/02/2024', 'Ivory Coast', 'Congo', 1, 0),
+    ('10/02/2024', 'South Africa', 'Congo', 0, 0)
+]
+
+
+def test_drawn_semi_final_followed_by_third_place_match():
+    games = list(get_games(SEMI_FINALS).itertuples())
+    assert get_knockout_winners(games, final_round=1) == ['Nigeria', 'Ivory Coast', None]
+
+
+def test_drawn_semi_final_with_final_played():
+    games = list(get_games(SEMI_FINALS + [('11/02/2024', 'Nigeria', 'Ivory Coast', 1, 2)]).itertuples())
+    assert get_knockout_winners(games, final_round=1) == ['Nigeria', 'Ivory Coast', None, 'Ivory Coast']
+
+
+def test_drawn_tie_before_the_last_round():
+    games = list(get_games([
+        ('01/02/2024', 'A', 'B', 0, 0),
+        ('01/02/2024', 'C', 'D', 2, 1),
+        ('03/02/2024', 'B', 'C', 1, 0)
+    ]).itertuples())
+    assert get_knockout_winners(games, final_round=2) == ['B', 'C', 'B']
+
+
+def test_simulation_keeps_winner_of_drawn_semi_final():
+    # Two groups of three, all played, whose first two teams play the semi-finals
+    groups = {'A': ['Nigeria', 'Congo', 'Gambia'], 'B': ['Ivory Coast', 'South Africa', 'Namibia']}
+    round_of_16 = [('1A', '2B'), ('1B', '2A')]
+    games_df = get_games([
+        ('20/01/2024', 'Nigeria', 'Congo', 2, 0),
+        ('20/01/2024', 'Ivory Coast', 'South Africa', 2, 0),
+        ('24/01/2024', 'Nigeria', 'Gambia', 2, 0),
+        ('24/01/2024', 'Ivory Coast', 'Namibia', 2, 0),
+        ('28/01/2024', 'Congo', 'Gambia', 2, 0),
+        ('28/01/2024', 'South Africa', 'Namibia', 2, 0)
+    ] + SEMI_FINALS)
+    fixtures_df = get_games([('11/02/2024', 'Nigeria', 'Ivory Coast', None, None)])[['Date', 'HomeTeam', 'AwayTeam']]
+
+    team_strength_index = TeamStrengthIndex.from_games(add_weights(games_df.copy(), reference_date='12/02/2024'))
+    tournament = build_tournament(team_strength_index, games_df, fixtures_df, groups, round_of_16)
+    simulation_df = simulate_tournament(tournament, nb_simulations=1000, seed=0).set_index('Nation')
+
+    # Second column: teams reaching the final of this four-team bracket
+    finalists = simulation_df.iloc[:, 1]
+    assert finalists['Nigeria'] == 100 and finalists['Ivory Coast'] == 100
+    assert finalists['South Africa'] == 0 and finalists['Congo'] == 0
@@ -0,0 +1,318 @@
+import pandas as pd
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations, permutations, repeat
+import logging
+import config
+from goal_distribution import poisson_pmf
+import storage
+from storage import load_table
+from weighting import DEFAULT_DECAY, DEFAULT_KERNEL
+from MatchHistory import MatchHistory
+
+
+STAGES = ['RoundOf16', 'QuarterFinal', 'SemiFinal', 'Final', 'Winner']
+
+# Extra time lasts a third of the regular time, goals are scored at the same rate
+EXTRA_TIME_SHARE = 30 / 90
+
+# Group matches are drawn from Poisson distributions truncated at this number of goals
+MAX_GOALS = 20
+
+
+# Cumulative Poisson probabilities of 0 to MAX_GOALS - 1 goals, on a new last axis
+def get_goal_cdf(rates):
+    return np.cumsum(poisson_pmf(rates, MAX_GOALS), axis=-1)
+
+
+# Group of origin of the third-placed team playing in each '3...' slot, for every set of
+# qualifying groups. Rows are indexed by the bitmask of the qualifying groups.
+def get_third_place_table(group_names, third_place_slots):
+    nb_thirds = len(third_place_slots)
+    table = np.full((2 ** len(group_names), nb_thirds), -1, dtype=int)
+    for qualified_groups in combinations(range(len(group_names)), nb_thirds):
+        for assignment in permutations(qualified_groups):
+            if all(group_names[group] in slot for group, slot in zip(assignment, third_place_slots)):
+                table[sum(1 << group for group in qualified_groups)] = assignment
+                break
+    return table
+
+
+# Winner of a level knockout tie named in SpecialWinConditions (extra time, penalties), None
+# when the games have no such column or the text names neither team
+def get_special_winner(game):
+    condition = getattr(game, 'SpecialWinConditions', None)
+    if isinstance(condition, str):
+        positions = {team: condition.find(team) for team in (game.HomeTeam, game.AwayTeam) if team in condition}
+        if positions:
+            return min(positions, key=positions.get)
+    return None
+
+
+# Winner of each played knockout tie, in the order of the games (sorted by date), None when it is
+# not known yet. A level tie without SpecialWinConditions (the scraped Game table has none) is
+# settled by the next round. The round of a tie is the number of knockout games its teams played
+# before it, 'final_round' being the round of the final and of the third-place match. The winner
+# plays a tie of the next round against the winner of another tie, while the third-place match is
+# played against the loser of the other semi-final. Before the last round, losers are out and the
+# only team playing again is the winner. Ties are settled until nothing changes, as a winner may
+# depend on the winner of another level tie.
+def get_knockout_winners(knockout_games, final_round):
+    rounds = []
+    nb_played = {}
+    for game in knockout_games:
+        rounds.append(max(nb_played.get(game.HomeTeam, 0), nb_played.get(game.AwayTeam, 0)))
+        for team in (game.HomeTeam, game.AwayTeam):
+            nb_played[team] = nb_played.get(team, 0) + 1
+
+    winners = []
+    for game in knockout_games:
+        if game.HomeTeamGoal != game.AwayTeamGoal:
+            winners.append(game.HomeTeam if game.HomeTeamGoal > game.AwayTeamGoal else game.AwayTeam)
+        else:
+            winners.append(get_special_winner(game))
+
+    # Index and game of the tie of the given round played by the team
+    def get_tie(team, round_number):
+        for i, (game, game_round) in enumerate(zip(knockout_games, rounds)):
+            if game_round == round_number and team in (game.HomeTeam, game.AwayTeam):
+                return i, game
+        return None, None
+
+    def get_winner(game, round_number):
+        teams = (game.HomeTeam, game.AwayTeam)
+        next_ties = {team: get_tie(team, round_number + 1)[1] for team in teams}
+        playing_again = [team for team in teams if next_ties[team] is not None]
+
+        for team in playing_again:
+            next_tie = next_ties[team]
+            opponent = next_tie.AwayTeam if next_tie.HomeTeam == team else next_tie.HomeTeam
+            opponent_tie, _ = get_tie(opponent, round_number)
+            if opponent_tie is not None and winners[opponent_tie] is not None:
+                is_against_winner = winners[opponent_tie] == opponent
+                return team if is_against_winner else teams[1 - teams.index(team)]
+
+        if len(playing_again) == 1 and round_number + 1 < final_round:
+            return playing_again[0]
+        return None
+
+    is_changed = True
+    while is_changed:
+        is_changed = False
+        for i, (game, round_number) in enumerate(zip(knockout_games, rounds)):
+            if winners[i] is None:
+                winners[i] = get_winner(game, round_number)
+                is_changed = is_changed or winners[i] is not None
+    return winners
+
+
+# Arrays describing the tournament: teams, expected goals of every pairing, group matches
+# (with the scores of those already played) and the round of 16 bracket
+def build_tournament(team_strength_index, games_df, fixtures_df, groups=config.GROUPS, round_of_16=config.ROUND_OF_16):
+    group_names = list(groups)
+    teams = [team for group_name in group_names for team in groups[group_name]]
+    team_ids = {team: i for i, team in enumerate(teams)}
+    group_teams = np.array([[team_ids[team] for team in groups[group_name]] for group_name in group_names])
+
+    # Same rates as predict_goals for every (home, away) pairing, teams without history get the average rate
+    home_rates, away_rates = team_strength_index.get_rates(np.repeat(teams, len(teams)), np.tile(teams, len(teams)))
+    rates = np.stack([home_rates, away_rates]).reshape(2, len(teams), len(teams))
+    rates[np.isnan(rates)] = np.nanmean(rates)
+
+    group_pairs = {frozenset(pair) for group in group_teams for pair in combinations(group, 2)}
+
+    # The first meeting of two teams of the same group is their group match, any other game is a knockout tie
+    group_scores = {}
+    knockout_goals = np.full((len(teams), len(teams), 2), -1, dtype=int)
+    knockout_winners = np.full((len(teams), len(teams)), -1, dtype=int)
+    knockout_games = []
+    games_df = games_df.assign(ParsedDate=pd.to_datetime(games_df['Date'], format='%d/%m/%Y')).sort_values('ParsedDate')
+    for game in games_df.itertuples():
+        if game.HomeTeam not in team_ids or game.AwayTeam not in team_ids:
+            continue
+        home, away = team_ids[game.HomeTeam], team_ids[game.AwayTeam]
+        goals = (int(game.HomeTeamGoal), int(game.AwayTeamGoal))
+        pair = frozenset((home, away))
+        if pair in group_pairs and (home, away) not in group_scores and (away, home) not in group_scores:
+            group_scores[(home, away)] = goals
+        else:
+            knockout_goals[home, away] = goals
+            knockout_goals[away, home] = goals[::-1]
+            knockout_games.append(game)
+
+    # Ties already played keep their real winner
+    for game, winner in zip(knockout_games, get_knockout_winners(knockout_games, int(np.log2(len(round_of_16))))):
+        if winner is not None:
+            home, away = team_ids[game.HomeTeam], team_ids[game.AwayTeam]
+            knockout_winners[home, away] = knockout_winners[away, home] = team_ids[winner]
+
+    # Group matches keep the orientation of the played game or of the scheduled fixture
+    upcoming = {(team_ids.get(home), team_ids.get(away)) for home, away in zip(fixtures_df['HomeTeam'], fixtures_df['AwayTeam'])}
+    group_matches = []
+    for group in group_teams:
+        for home, away in combinations(group, 2):
+            if (away, home) in group_scores or ((away, home) in upcoming and (home, away) not in group_scores):
+                home, away = away, home
+            group_matches.append((home, away))
+    group_matches = np.array(group_matches)
+    group_is_played = np.array([tuple(match) in group_scores for match in group_matches])
+    group_goals = np.array([group_scores.get(tuple(match), (0, 0)) for match in group_matches])
+
+    third_place_slots = [slot[1:] for tie in round_of_16 for slot in tie if slot.startswith('3')]
+    bracket_slots = []
+    third_place_count = 0
+    for slot in [slot for tie in round_of_16 for slot in tie]:
+        if slot.startswith('3'):
+            bracket_slots.append((2, third_place_count))
+            third_place_count += 1
+        else:
+            bracket_slots.append((int(slot[0]) - 1, group_names.index(slot[1])))
+
+    return {
+        'Teams': teams,
+        'GroupTeams': group_teams,
+        'Rates': rates,
+        'GroupMatches': group_matches,
+        # Cumulative goal probabilities of the home and away sides of every group match
+        'GroupGoalCdf': get_goal_cdf(rates[:, group_matches[:, 0], group_matches[:, 1]]),
+        'GroupIsPlayed': group_is_played,
+        'GroupGoals': group_goals,
+        'KnockoutGoals': knockout_goals,
+        'KnockoutWinners': knockout_winners,
+        'BracketSlots': bracket_slots,
+        'ThirdPlaceTable': get_third_place_table(group_names, third_place_slots)
+    }
+
+
+# Group standings of every simulation, goals are arrays of shape (n_group_matches, n_simulations)
+def rank_groups(tournament, rng, home_goals, away_goals):
+    nb_simulations = home_goals.shape[1]
+    nb_teams = len(tournament['Teams'])
+
+    # Points, then goal difference, then goals scored, packed in one sortable number
+    scores = np.zeros((nb_teams, nb_simulations), dtype=np.int64)
+    for match, (home, away) in enumerate(tournament['GroupMatches']):
+        home_goal, away_goal = home_goals[match], away_goals[match]
+        goal_difference = home_goal - away_goal
+        is_draw = goal_difference == 0
+        scores[home] += 3_000_000 * (goal_difference > 0) + 1_000_000 * is_draw + 1000 * goal_difference + home_goal
+        scores[away] += 3_000_000 * (goal_difference < 0) + 1_000_000 * is_draw - 1000 * goal_difference + away_goal
+
+    # Remaining ties are settled by drawing of lots
+    keys = scores + rng.random((nb_teams, nb_simulations))
+
+    group_teams = tournament['GroupTeams']
+    group_keys = keys.T[:, group_teams]
+    order = np.argsort(-group_keys, axis=2)
+    ranked_teams = group_teams[np.arange(group_teams.shape[0])[np.newaxis, :, np.newaxis], order]
+    ranked_keys = np.take_along_axis(group_keys, order, axis=2)
+    return ranked_teams, ranked_keys
+
+
+def play_knockout(tournament, rng, home_teams, away_teams):
+    home_rates = tournament['Rates'][0, home_teams, away_teams]
+    away_rates = tournament['Rates'][1, home_teams, away_teams]
+    home_goals = rng.poisson(home_rates)
+    away_goals = rng.poisson(away_rates)
+
+    is_draw = home_goals == away_goals
+    home_goals[is_draw] += rng.poisson(home_rates[is_draw] * EXTRA_TIME_SHARE)
+    away_goals[is_draw] += rng.poisson(away_rates[is_draw] * EXTRA_TIME_SHARE)
+
+    played_goals = tournament['KnockoutGoals'][home_teams, away_teams]
+    is_played = played_goals[..., 0] >= 0
+    home_goals = np.where(is_played, played_goals[..., 0], home_goals)
+    away_goals = np.where(is_played, played_goals[..., 1], away_goals)
+
+    # Penalty shoot-outs are a coin flip, only drawn for ties whose winner is not known
+    is_draw = home_goals == away_goals
+    home_wins = np.where(is_draw, rng.random(home_teams.shape) < 0.5, home_goals > away_goals)
+    winners = np.where(home_wins, home_teams, away_teams)
+
+    # Ties already played keep their real winner
+    played_winners = tournament['KnockoutWinners'][home_teams, away_teams]
+    return np.where(played_winners >= 0, played_winners, winners)
+
+
+# Number of simulations in which each team reached each stage, array of shape (n_teams, n_stages)
+def simulate_chunk(tournament, nb_simulations, seed_sequence):
+    rng = np.random.default_rng(seed_sequence)
+    is_played = tournament['GroupIsPlayed']
+
+    # Inverse transform sampling of the group match goals, each match has a fixed distribution
+    group_goal_cdf = tournament['GroupGoalCdf']
+    uniforms = rng.random(group_goal_cdf.shape[:-1] + (nb_simulations,))
+    goals = np.empty(uniforms.shape, dtype=np.int64)
+    for side in range(2):
+        for match in range(group_goal_cdf.shape[1]):
+            goals[side, match] = np.searchsorted(group_goal_cdf[side, match], uniforms[side, match], side='right')
+    home_goals, away_goals = goals
+    home_goals[is_played] = tournament['GroupGoals'][is_played, 0][:, np.newaxis]
+    away_goals[is_played] = tournament['GroupGoals'][is_played, 1][:, np.newaxis]
+
+    ranked_teams, ranked_keys = rank_groups(tournament, rng, home_goals, away_goals)
+
+    # Best third-placed teams and the slots they are drawn into
+    third_place_table = tournament['ThirdPlaceTable']
+    best_thirds = np.argsort(-ranked_keys[:, :, 2], axis=1)[:, :third_place_table.shape[1]]
+    third_groups = third_place_table[(1 << best_thirds).sum(axis=1)]
+
+    simulations = np.arange(nb_simulations)
+    bracket = []
+    for position, index in tournament['BracketSlots']:
+        if position == 2:
+            bracket.append(ranked_teams[simulations, third_groups[:, index], 2])
+        else:
+            bracket.append(ranked_teams[:, index, position])
+    teams = np.stack(bracket, axis=1)
+
+    reached = np.zeros((len(tournament['Teams']), len(STAGES)), dtype=np.int64)
+    for stage in range(len(STAGES)):
+        reached[:, stage] = np.bincount(teams.ravel(), minlength=len(tournament['Teams']))
+        if teams.shape[1] > 1:
+            teams = play_knockout(tournament, rng, teams[:, 0::2], teams[:, 1::2])
+    return reached
+
+
+# Probability (in %) of each nation reaching each stage, simulations run in chunks that can
+# be spread over several processes
+def simulate_tournament(tournament, nb_simulations=100_000, seed=None, n_jobs=1, chunk_size=100_000):
+    chunks = [chunk_size] * (nb_simulations // chunk_size)
+    if nb_simulations % chunk_size:
+        chunks.append(nb_simulations % chunk_size)
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(chunks))
+
+    if n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            results = list(executor.map(simulate_chunk, repeat(tournament), chunks, seed_sequences))
+    else:
+        results = [simulate_chunk(tournament, chunk, seed_sequence) for chunk, seed_sequence in zip(chunks, seed_sequences)]
+
+    reached = np.sum(results, axis=0) / nb_simulations * 100
+    simulation_df = pd.DataFrame(reached, columns=STAGES)
+    simulation_df.insert(0, 'Nation', tournament['Teams'])
+    return simulation_df.sort_values(by=STAGES[::-1], ascending=False, ignore_index=True)
+
+
+def main(nb_simulations=100_000, seed=None, n_jobs=1, kernel=DEFAULT_KERNEL, decay=DEFAULT_DECAY, tables=None):
+    logging.info('Tournament Simulation.')
+    logger = logging.getLogger('__simulation__')
+    logger.setLevel(logging.INFO)
+
+    past_games_df = load_table('PastGames', tables)
+    games_df = load_table('Game', tables)
+    fixtures_df = load_table('Fixture', tables)
+    logger.info("Datasets successfully loaded.")
+
+    past_games_df = past_games_df[['Date', 'HomeTeam', 'AwayTeam', 'HomeTeamGoal', 'AwayTeamGoal']]
+    history = MatchHistory()
+    history.append(past_games_df, source='PastGames')
+    history.append(games_df, source='Game')
+    team_strength_index = history.get_team_strength_index(kernel, decay)
+
+    tournament = build_tournament(team_strength_index, games_df, fixtures_df)
+    simulation_df = simulate_tournament(tournament, nb_simulations, seed, n_jobs)
+
+    simulation_df = storage.write_table(simulation_df, 'Simulation')
+    logger.info(f"Tournament simulated {nb_simulations} times and saved in local computer!")
+    return {'Simulation': simulation_df}
@@ -0,0 +1,122 @@
+import pandas as pd
+import numpy as np
+from datetime import datetime
+from TeamStrengthIndex import TeamStrengthIndex
+
+
+DEFAULT_KERNEL = 'exponential'
+DEFAULT_DECAY = 0.1
+
+DAYS_PER_YEAR = 365.25
+
+
+# Weight decaying exponentially with the number of calendar years, decay is the rate per year
+def exponential_kernel(dates, reference_date, decay):
+    return np.exp(-decay * (reference_date.year - dates.dt.year).to_numpy())
+
+
+# Weight decaying exponentially with the number of days, decay is still expressed per year
+def exponential_days_kernel(dates, reference_date, decay):
+    return np.exp(-decay * (reference_date - dates).dt.days.to_numpy() / DAYS_PER_YEAR)
+
+
+# Weight halved every 'decay' years
+def half_life_kernel(dates, reference_date, decay):
+    return 0.5 ** ((reference_date - dates).dt.days.to_numpy() / DAYS_PER_YEAR / decay)
+
+
+# Full weight for the 'decay' most recent editions (one edition per year) up to the reference date,
+# no weight for older ones. Editions are counted among the games given, so this kernel depends on
+# the whole history rather than on each game alone.
+def edition_step_kernel(dates, reference_date, decay):
+    editions = dates.dt.year
+    past_editions = np.sort(editions[editions <= reference_date.year].unique())[::-1]
+    return editions.isin(past_editions[:int(decay)]).to_numpy(dtype=float)
+
+
+KERNELS = {
+    'exponential': exponential_kernel,
+    'exponential_days': exponential_days_kernel,
+    'half_life': half_life_kernel,
+    'edition_step': edition_step_kernel
+}
+
+# Kernels whose weights cannot be computed for new games without the rest of the history
+HISTORY_DEPENDENT_KERNELS = {'edition_step'}
+
+# Kernels giving the same weight to every game of a calendar year
+YEAR_KERNELS = {'exponential', 'edition_step'}
+
+DECAY_CANDIDATES = {
+    'exponential': np.linspace(0, 1, 41),
+    'exponential_days': np.linspace(0, 1, 41),
+    'half_life': np.arange(1, 31),
+    'edition_step': np.arange(1, 21)
+}
+
+
+# Parse the 'Date' column once, frames whose dates are already datetime64 are left untouched
+def parse_dates(df):
+    if not pd.api.types.is_datetime64_any_dtype(df['Date']):
+        df['Date'] = pd.to_datetime(df['Date'], format='%d/%m/%Y')
+    return df
+
+
+def add_weights(df, kernel=DEFAULT_KERNEL, decay=DEFAULT_DECAY, reference_date=None):
+    df = parse_dates(df)
+
+    # Reference date
+    reference_date = pd.Timestamp(datetime.now() if reference_date is None else reference_date)
+
+    # Difference in years from the reference date
+    df['YearsFromRef'] = reference_date.year - df['Date'].dt.year
+
+    # A smaller decay means that the weight decreases more slowly
+    df['Weight'] = KERNELS[kernel](df['Date'], reference_date, decay)
+
+    return df
+
+
+# Rates below this are clamped so that a team that never scored does not give -inf
+MIN_RATE = 1e-6
+
+
+# Log-likelihood of the observed score of each game under the team-average Poisson model. Games
+# involving a team without history, or without a score, cannot be predicted and are NaN.
+def get_log_likelihoods(team_strength_index, games_df):
+    home_rates, away_rates = team_strength_index.get_rates(games_df['HomeTeam'].to_numpy(), games_df['AwayTeam'].to_numpy())
+    goals = np.stack([games_df['HomeTeamGoal'].to_numpy(float), games_df['AwayTeamGoal'].to_numpy(float)])
+    rates = np.stack([home_rates, away_rates]).astype(float)
+
+    is_known = ~(np.isnan(rates) | np.isnan(goals)).any(axis=0)
+    goals = np.where(is_known, goals, 0).astype(int)
+    rates = np.maximum(np.where(is_known, rates, 1), MIN_RATE)
+
+    log_factorials = np.concatenate([[0], np.cumsum(np.log(np.arange(1, goals.max(initial=0) + 1)))])
+    log_likelihoods = (goals * np.log(rates) - rates - log_factorials[goals]).sum(axis=0)
+    return np.where(is_known, log_likelihoods, np.nan)
+
+
+# Decay maximising the out-of-sample log-likelihood of the last editions, each one predicted
+# with the games played before it. Every candidate is scored on the same games, those that all of
+# them can predict, and candidates are compared on the mean log-likelihood per game. Returns the
+# best decay and the score of every candidate.
+def fit_decay(df, kernel=DEFAULT_KERNEL, candidates=None, nb_editions=5):
+    df = parse_dates(df.copy())
+    candidates = DECAY_CANDIDATES[kernel] if candidates is None else candidates
+    editions = np.sort(df['Date'].dt.year.unique())[-nb_editions:]
+
+    log_likelihoods = {decay: [] for decay in candidates}
+    for edition in editions:
+        is_edition = df['Date'].dt.year == edition
+        edition_start = df.loc[is_edition, 'Date'].min()
+        history_df = df[df['Date'] < edition_start].copy()
+        for decay in candidates:
+            history_df = add_weights(history_df, kernel, decay, reference_date=edition_start)
+            team_strength_index = TeamStrengthIndex.from_games(history_df)
+            log_likelihoods[decay].append(get_log_likelihoods(team_strength_index, df[is_edition]))
+
+    log_likelihoods = pd.DataFrame({decay: np.concatenate(values) for decay, values in log_likelihoods.items()})
+    log_likelihoods = log_likelihoods[log_likelihoods.notna().all(axis=1)]
+    scores = log_likelihoods.mean().rename('LogLikelihood')
+    return scores.idxmax(), scores